@@ -17,7 +17,71 @@ class Settings(BaseSettings):
     ALLOWED_ORIGINS: List[str] = ["*"]
 
     RESEARCH_COLLECTION: str = "research"
+    FILE_BLOBS_COLLECTION: str = "fileBlobs"
+    BULK_UPLOAD_MAX_FILES: int = 500
+    BULK_UPLOAD_MAX_TOTAL_BYTES: int = 1024 * 1024 * 1024
+    STORAGE_COMPRESSION: str = "gzip"
+    STORAGE_COMPRESSION_LEVEL: int = 6
+    STORAGE_COMPRESSION_MAX_RATIO: float = 0.9
+    BULK_UPLOAD_CONCURRENCY: int = 8
     CHATHISTORY_COLLECTION: str= "chatHistory"
+    CHAT_MESSAGES_COLLECTION: str = "chatMessages"
+    CHAT_MESSAGES_BUCKET_SIZE: int = 50
+
+    EMBEDDING_MODEL: str = "models/gemini-embedding-001"
+    DOCUMENT_INDEX_BUCKET: str = "documentIndexes"
+    DOCUMENT_INDEX_CACHE_BYTES: int = 256 * 1024 * 1024
+    EMBEDDING_CACHE_COLLECTION: str = "embeddingCache"
+    DOCUMENT_TEXT_COLLECTION: str = "documentText"
+    SEARCH_BODY_MAX_CHARS: int = 100_000
+    LIBRARY_CHUNKS_COLLECTION: str = "libraryChunks"
+    LIBRARY_VERSIONS_COLLECTION: str = "libraryVersions"
+    LIBRARY_INDEX_CACHE_BYTES: int = 256 * 1024 * 1024
+    LIBRARY_TOP_K: int = 6
+
+    DOCUMENT_SUMMARY_COLLECTION: str = "documentSummaries"
+    SUMMARY_CHUNK_SIZE: int = 12000
+    SUMMARY_CHUNK_OVERLAP: int = 500
+    SUMMARY_MAP_CONCURRENCY: int = 8
+    SUMMARY_REDUCE_TOKEN_LIMIT: int = 100_000
+    SUMMARY_CACHE_COLLECTION: str = "summaryCache"
+    SUMMARY_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    SUMMARY_CACHE_MAX_ENTRIES: int = 10_000
+    SUMMARY_CACHE_MEMORY_BYTES: int = 32 * 1024 * 1024
+
+    VIDEO_TRANSCRIPTS_COLLECTION: str = "videoTranscripts"
+    TRANSCRIPT_FETCH_TIMEOUT_SECONDS: float = 30.0
+
+    WEB_SEARCH_PROVIDER: str = "tavily"
+    WEB_SEARCH_TIMEOUT_SECONDS: float = 10.0
+    WEB_SEARCH_CACHE_TTL_SECONDS: int = 15 * 60
+    WEB_SEARCH_CACHE_BYTES: int = 8 * 1024 * 1024
+    CONTEXT_RETRIEVAL_TIMEOUT_SECONDS: float = 30.0
+
+    INGESTION_JOBS_COLLECTION: str = "ingestionJobs"
+    INGESTION_WORKERS: int = 2
+    INGESTION_POLL_SECONDS: float = 10.0
+    INGESTION_LEASE_SECONDS: int = 600
+    INGESTION_MAX_ATTEMPTS: int = 3
+
+    PARSER_WORKERS: int = 2
+    PARSER_TIMEOUT_SECONDS: float = 120.0
+    PARSER_MAX_PAGES: int = 2000
+    PARSER_MAX_BYTES: int = 100 * 1024 * 1024
+    PARSER_PAGES_PER_JOB: int = 16
+
+    DOCUMENT_LOAD_MEMORY_LIMIT: int = 32 * 1024 * 1024
+    DOCUMENT_LOAD_MEMORY_BUDGET: int = 256 * 1024 * 1024
+    DOCUMENT_SPOOL_DIR: Optional[str] = None
+
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_MAX_RETRIES: int = 5
+    LLM_RETRY_BASE_SECONDS: float = 1.0
+    LLM_RETRY_MAX_SECONDS: float = 30.0
+
+    CHAT_HISTORY_TOKEN_BUDGET: int = 4000
+    CHAT_HISTORY_FETCH_LIMIT: int = 40
+    CHAT_SUMMARY_MODEL: str = "gemini-2.5-flash-lite"
 
     OPENAI_API_KEY: Optional[str] = None
 
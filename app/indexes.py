@@ -0,0 +1,178 @@
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
+from app.database import get_collection
+from app.config import settings
+from typing import List
+
+# Every index the application's queries rely on, declared in one place and
+# created idempotently at startup.
+INDEXES = [
+    {
+        "collection": settings.RESEARCH_COLLECTION,
+        "keys": [("user_id", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+        "name": "user_createdAt_id",
+    },
+    {
+        "collection": settings.RESEARCH_COLLECTION,
+        "keys": [("user_id", ASCENDING), ("nameTokens", ASCENDING)],
+        "name": "user_nameTokens",
+    },
+    {
+        "collection": settings.RESEARCH_COLLECTION,
+        "keys": [("user_id", ASCENDING), ("researchName", TEXT), ("fileName", TEXT)],
+        "name": "user_text",
+        "weights": {"researchName": 10, "fileName": 5},
+        "default_language": "english",
+    },
+    {
+        "collection": settings.RESEARCH_COLLECTION,
+        "keys": [("file_id", ASCENDING)],
+        "name": "file_id",
+    },
+    {
+        "collection": settings.DOCUMENT_TEXT_COLLECTION,
+        "keys": [("user_id", ASCENDING), ("searchText", TEXT)],
+        "name": "user_body_text",
+        "default_language": "english",
+    },
+    {
+        "collection": settings.DOCUMENT_TEXT_COLLECTION,
+        "keys": [("file_id", ASCENDING)],
+        "name": "file_id",
+    },
+    {
+        "collection": settings.CHATHISTORY_COLLECTION,
+        "keys": [("user_id", ASCENDING), ("createdAt", DESCENDING)],
+        "name": "user_createdAt",
+    },
+    {
+        "collection": settings.CHAT_MESSAGES_COLLECTION,
+        "keys": [("chat_id", ASCENDING), ("seq", ASCENDING)],
+        "name": "chat_seq",
+        "unique": True,
+    },
+    {
+        "collection": settings.LIBRARY_CHUNKS_COLLECTION,
+        "keys": [("user_id", ASCENDING)],
+        "name": "user",
+    },
+    {
+        "collection": settings.LIBRARY_CHUNKS_COLLECTION,
+        "keys": [("research_id", ASCENDING)],
+        "name": "research",
+    },
+    {
+        "collection": settings.DOCUMENT_SUMMARY_COLLECTION,
+        "keys": [("file_id", ASCENDING)],
+        "name": "file",
+    },
+    {
+        "collection": settings.INGESTION_JOBS_COLLECTION,
+        "keys": [("status", ASCENDING), ("updatedAt", ASCENDING)],
+        "name": "status_updatedAt",
+    },
+    {
+        "collection": settings.SUMMARY_CACHE_COLLECTION,
+        "keys": [("expiresAt", ASCENDING)],
+        "name": "expiresAt_ttl",
+        "expireAfterSeconds": 0,
+    },
+    {
+        "collection": settings.SUMMARY_CACHE_COLLECTION,
+        "keys": [("createdAt", ASCENDING)],
+        "name": "createdAt",
+    },
+    {
+        "collection": settings.SUMMARY_CACHE_COLLECTION,
+        "keys": [("file_ids", ASCENDING)],
+        "name": "file_ids",
+    },
+    {
+        "collection": settings.FILE_BLOBS_COLLECTION,
+        "keys": [("file_id", ASCENDING)],
+        "name": "file_id",
+        "unique": True,
+    },
+    {
+        "collection": f"{settings.DOCUMENT_INDEX_BUCKET}.files",
+        "keys": [("metadata.research_id", ASCENDING)],
+        "name": "research_id",
+    },
+    {
+        "collection": f"{settings.DOCUMENT_INDEX_BUCKET}.files",
+        "keys": [("metadata.file_id", ASCENDING)],
+        "name": "file_id",
+    },
+]
+
+
+def _options(spec: dict) -> dict:
+    return {key: value for key, value in spec.items() if key not in ("collection", "keys")}
+
+
+def _differences(spec: dict, index: dict) -> List[str]:
+    """Ways an existing index differs from its declaration; empty when it matches."""
+    differences = []
+    # Text indexes are listed with internal _fts/_ftsx keys, so only compare plain ones
+    if not any(direction == TEXT for _, direction in spec["keys"]):
+        if list(index["key"].items()) != [tuple(key) for key in spec["keys"]]:
+            differences.append("key")
+    for option, declared in _options(spec).items():
+        if option == "name":
+            continue
+        existing = index.get(option, False if isinstance(declared, bool) else None)
+        if existing != declared:
+            differences.append(option)
+    return differences
+
+
+async def ensure_indexes() -> None:
+    for spec in INDEXES:
+        collection = await get_collection(spec["collection"])
+        try:
+            await collection.create_index(spec["keys"], **_options(spec))
+        except OperationFailure as e:
+            print(f"Failed to create index {spec['name']} on {spec['collection']}: {e}")
+
+
+async def index_report() -> List[dict]:
+    report = []
+    for collection_name in sorted({spec["collection"] for spec in INDEXES}):
+        collection = await get_collection(collection_name)
+        declared = [spec for spec in INDEXES if spec["collection"] == collection_name]
+
+        existing = {}
+        async for index in collection.list_indexes():
+            existing[index["name"]] = index
+
+        usage = {}
+        try:
+            async for stats in collection.aggregate([{"$indexStats": {}}]):
+                usage[stats["name"]] = {
+                    "ops": stats["accesses"]["ops"],
+                    "since": stats["accesses"]["since"],
+                }
+        except OperationFailure as e:
+            print(f"$indexStats unavailable for {collection_name}: {e}")
+
+        missing = [spec["name"] for spec in declared if spec["name"] not in existing]
+        mismatched = {}
+        for spec in declared:
+            if spec["name"] in existing:
+                differences = _differences(spec, existing[spec["name"]])
+                if differences:
+                    mismatched[spec["name"]] = differences
+        unused = [
+            name for name, stats in usage.items()
+            if name != "_id_" and stats["ops"] == 0
+        ]
+        report.append({
+            "collection": collection_name,
+            "declared": [spec["name"] for spec in declared],
+            "existing": list(existing.keys()),
+            "missing": missing,
+            "mismatched": mismatched,
+            "unused": unused,
+            "usage": usage,
+        })
+    return report
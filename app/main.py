@@ -1,8 +1,14 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.database import connect_to_mongo, close_mongo_connection
-from app.routes import researchWork, chat
+from app.routes import researchWork, chat, admin
+from app.utils.parsing import parsing_engine
+from app.indexes import ensure_indexes
+from app.utils.ingestion import ingestion_worker
+from app.utils.llm_scheduler import llm_scheduler
+from app.utils.metrics import MetricsMiddleware, Gauge, register, render_metrics
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -17,18 +23,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
+app.add_middleware(MetricsMiddleware)
+
+register(Gauge("volvox_llm_in_flight", "LLM calls currently running.", lambda: llm_scheduler.stats()["in_flight"]))
+register(Gauge("volvox_llm_queue_depth", "LLM calls waiting for a slot.", lambda: llm_scheduler.stats()["queue_depth"]))
 
 @app.on_event("startup")
 async def startup_event():
     await connect_to_mongo()
+    await ensure_indexes()
+    ingestion_worker.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await ingestion_worker.stop()
+    parsing_engine.shutdown()
     await close_mongo_connection()
 
 app.include_router(researchWork.router, prefix=settings.API_V1_PREFIX)
 app.include_router(chat.router, prefix=settings.API_V1_PREFIX)
+app.include_router(admin.router, prefix=settings.API_V1_PREFIX)
 
 @app.get("/")
 async def root():
@@ -38,6 +54,10 @@ async def root():
         "status": "active"
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "database": "connected"}
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, status
+from app.indexes import ensure_indexes, index_report
+from typing import List
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+@router.get('/indexes', response_model=List[dict], status_code=status.HTTP_200_OK)
+async def getIndexes():
+    return await index_report()
+
+@router.post('/indexes', response_model=List[dict], status_code=status.HTTP_200_OK)
+async def createIndexes():
+    await ensure_indexes()
+    return await index_report()
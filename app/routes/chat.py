@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException, status, Depends, File, Form, Query
 from fastapi.responses import StreamingResponse
-from app.utils.rag_utils import generateResponse
+from app.utils.rag_utils import generateResponse, streamResponse
 from app.utils.summarizer import SummarizeResearch, SummarizeVideo, SummarizeTextResearch
+from app.utils.llm_scheduler import llm_scheduler
+from app.utils.chat_messages import append_message, fetch_messages, delete_chat_messages, migrate_chat
 
 from app.models.chatHistory import Message
 
@@ -11,6 +13,7 @@ from datetime import datetime, timezone
 from bson import ObjectId
 from typing import List, AsyncGenerator, Optional
 import mimetypes
+import json
 from pathlib import Path
 from pydantic import BaseModel
 
@@ -22,47 +25,57 @@ class SummarizeTextBody(BaseModel):
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-@router.post('/ask', response_model=dict, status_code=status.HTTP_200_OK)
-async def askLLM(
-    user_id: str = Query(..., alias="user_id"),
-    question: str= Query(...),
-    chat_id: Optional[str]= Query(None),
-    document_id: Optional[str]= Query(None),
-    web_search: Optional[bool]= False
-):
-    response= await generateResponse(question,chat_id,document_id,web_search)
+async def get_owned_chat(chat_id: str, user_id: str):
+    chatHistory= await get_collection(settings.CHATHISTORY_COLLECTION)
+    chat_doc = await chatHistory.find_one({"_id": ObjectId(chat_id),"user_id":user_id},
+                                          {"title": 1, "messageCount": 1, "bucketed": 1})
+    if not chat_doc:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Chat with id '{chat_id}' not found",
+        )
+    if not chat_doc.get("bucketed"):
+        await migrate_chat(chat_doc["_id"])
+        chat_doc = await chatHistory.find_one({"_id": chat_doc["_id"]}, {"title": 1, "messageCount": 1})
+    return chat_doc
+
+async def save_chat_message(user_id, question, response, chat_doc=None, document_id=None):
     chatHistory= await get_collection(settings.CHATHISTORY_COLLECTION)
     new_message = Message(
         question=question,
         response=response,
         research_id=document_id,             
     )
-    if chat_id:
-        chat_doc = await chatHistory.find_one({"_id": ObjectId(chat_id),"user_id":user_id})
-        if not chat_doc:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Chat with id '{chat_id}' not found",
-            )
-
-        await chatHistory.update_one(
-            {"_id": ObjectId(chat_id)},
-            {
-                "$push": {"messages": new_message.dict(by_alias=True)},
-            },
-        )
-        final_chat_id = chat_id
+    if chat_doc:
+        final_chat_id = str(chat_doc["_id"])
         title= chat_doc.get("title")
     else:
         title= question[:50]
         insert_result = await chatHistory.insert_one({
             "user_id": user_id,
             "title": title,
-            "messages": [new_message.dict(by_alias=True)],
+            "messageCount": 0,
+            "bucketed": True,
             "createdAt": datetime.now(timezone.utc)
             }
         )
         final_chat_id= str(insert_result.inserted_id)
+    await append_message(final_chat_id, new_message.dict(by_alias=True))
+    return final_chat_id, title
+
+@router.post('/ask', response_model=dict, status_code=status.HTTP_200_OK)
+async def askLLM(
+    user_id: str = Query(..., alias="user_id"),
+    question: str= Query(...),
+    chat_id: Optional[str]= Query(None),
+    document_id: Optional[str]= Query(None),
+    web_search: Optional[bool]= False,
+    scope: Optional[str]= Query(None, pattern="^(document|library)$",
+                                description="'library' grounds the answer in all of the user's research"),
+):
+    chat_doc= await get_owned_chat(chat_id, user_id) if chat_id else None
+    response= await generateResponse(question,chat_id,document_id,web_search,user_id,scope)
+    final_chat_id, title= await save_chat_message(user_id, question, response, chat_doc, document_id)
     
     return {
         "response": response,
@@ -70,6 +83,40 @@ async def askLLM(
         "chat_title": title
     }
 
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    payload = f"data: {json.dumps(data)}\n\n"
+    if event:
+        payload = f"event: {event}\n" + payload
+    return payload
+
+@router.post('/ask/stream', status_code=status.HTTP_200_OK)
+async def askLLMStream(
+    user_id: str = Query(..., alias="user_id"),
+    question: str= Query(...),
+    chat_id: Optional[str]= Query(None),
+    document_id: Optional[str]= Query(None),
+    web_search: Optional[bool]= False,
+    scope: Optional[str]= Query(None, pattern="^(document|library)$",
+                                description="'library' grounds the answer in all of the user's research"),
+):
+    chat_doc= await get_owned_chat(chat_id, user_id) if chat_id else None
+
+    async def event_stream() -> AsyncGenerator[str, None]:
+        tokens= []
+        try:
+            async for token in streamResponse(question,chat_id,document_id,web_search,user_id,scope):
+                tokens.append(token)
+                yield sse_event({"token": token})
+        except Exception as e:
+            yield sse_event({"detail": str(e)}, event="error")
+            return
+
+        final_chat_id, title= await save_chat_message(user_id, question, "".join(tokens), chat_doc, document_id)
+        yield sse_event({"chat_id": final_chat_id, "chat_title": title}, event="done")
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
+
 @router.get('/chatHistory',response_model=List[dict],status_code=status.HTTP_200_OK)
 async def getChatHistory(
     user_id: str = Query(..., alias="user_id"),
@@ -95,17 +142,40 @@ async def getChatHistory(
     chat_id: str,
     user_id: str = Query(..., alias="user_id"),
 ):
-    chatHistoryModel= await get_collection(settings.CHATHISTORY_COLLECTION)
-    chat = await chatHistoryModel.find_one({"_id":ObjectId(chat_id),
-                                            "user_id": user_id})
-
-    if not chat:
+    try:
+        chat = await get_owned_chat(chat_id, user_id)
+    except HTTPException:
         raise HTTPException(status_code=404, detail="Chat not found")
-    
+
+    messages = await fetch_messages(chat_id, 0, chat.get("messageCount", 0))
     return{
         "chat_id": chat_id,
         "chat_title": chat.get("title"),
-        "messages": chat.get("messages",[])
+        "messages": messages
+    }
+
+@router.get('/chatHistory/{chat_id}/messages',response_model=dict,status_code=status.HTTP_200_OK)
+async def getChatMessages(
+    chat_id: str,
+    user_id: str = Query(..., alias="user_id"),
+    before: Optional[int] = Query(None, ge=0, description="Return messages with index lower than this"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    try:
+        chat = await get_owned_chat(chat_id, user_id)
+    except HTTPException:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    total = chat.get("messageCount", 0)
+    end = total if before is None else min(before, total)
+    start = max(0, end - limit)
+    messages = await fetch_messages(chat_id, start, end)
+    return {
+        "chat_id": chat_id,
+        "chat_title": chat.get("title"),
+        "messages": messages,
+        "total": total,
+        "next_before": start if start > 0 else None,
     }
 
 @router.delete('/deleteChat/{chat_id}',response_model=str, status_code=status.HTTP_200_OK)
@@ -115,33 +185,41 @@ async def deleteChat(
 ):
     chatHistoryModel= await get_collection(settings.CHATHISTORY_COLLECTION)
     chat= await chatHistoryModel.find_one({"_id":ObjectId(chat_id),
-                                           "user_id":user_id})
+                                           "user_id":user_id}, {"_id": 1})
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
     await chatHistoryModel.delete_one({"_id":ObjectId(chat_id),
                                            "user_id":user_id})
+    await delete_chat_messages(chat_id)
     return "Chat Deleted Successfully"
 
 @router.post('/summarize-research',response_model=str,status_code=status.HTTP_200_OK)
 async def summarizeResearch(
-        body: SummarizeBody
+        body: SummarizeBody,
+        user_id: Optional[str] = Query(None, alias="user_id"),
         ):
-    summary= await SummarizeResearch(body.documents)
+    summary= await SummarizeResearch(body.documents, user_id)
     return summary
 
 @router.post('/summarize-research-text',response_model=str,status_code=status.HTTP_200_OK)
 async def summarizeResearch(
-        body: SummarizeTextBody
+        body: SummarizeTextBody,
+        user_id: Optional[str] = Query(None, alias="user_id"),
         ):
-    summary= await SummarizeTextResearch(body.content)
+    summary= await SummarizeTextResearch(body.content, user_id)
     return summary
 
 @router.post('/summarize-video',response_model=str,status_code=status.HTTP_200_OK)
 async def summarizeVideo(
-        video_url: str
+        video_url: str,
+        user_id: Optional[str] = Query(None, alias="user_id"),
     ):
-    summary= await SummarizeVideo(video_url)
+    summary= await SummarizeVideo(video_url, user_id)
     return summary
+
+@router.get('/scheduler/stats',response_model=dict,status_code=status.HTTP_200_OK)
+async def schedulerStats():
+    return llm_scheduler.stats()
     
     
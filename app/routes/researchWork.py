@@ -1,19 +1,65 @@
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form, Query
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form, Query, Response, Request
 from fastapi.responses import StreamingResponse
 from app.schemas.researchWork import (
-    ResearchResponse
+    ResearchResponse, BulkResearchResponse
 )
 from app.models.reseachWork import ResearchModel
 from app.database import get_collection, get_gridfs_bucket
+from app.utils.index_store import invalidate_document_index
+from app.utils.text_cache import invalidate_text
+from app.utils.research_search import name_tokens, prefix_filter, search_research
+from app.utils.library_index import remove_research, rename_research
+from app.utils.ingestion import enqueue_ingestion, enqueue_ingestions, delete_ingestion, get_ingestion_status
+from app.utils.summarizer import invalidate_document_summaries
+from app.utils.summary_cache import invalidate_summary_cache
+from app.utils.storage import store_upload, release_file
+from app.utils.bulk_upload import BulkUploadError, expand_uploads, close_expanded
+from app.utils.compression import accepts_encoding, file_codec, iter_file, original_length
+from app.utils.http_files import (
+    file_etag, file_last_modified, http_date, is_not_modified, range_applies, parse_byte_range
+)
 from app.config import settings
 from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo.errors import BulkWriteError
 from typing import List, AsyncGenerator
 import mimetypes
+import asyncio
+import base64
+import json
 from pathlib import Path
 
 router = APIRouter(prefix="/research", tags=["Research"])
 
+def encode_cursor(created_at: datetime, doc_id: ObjectId) -> str:
+    payload = json.dumps({"c": created_at.isoformat(), "i": str(doc_id)})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["c"]), ObjectId(payload["i"])
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def file_url(model: ResearchModel) -> str:
+    # Blobs are shared between documents, so the URL names the document whose
+    # file name and content type the download should carry.
+    return f"{settings.API_V1_PREFIX}/research/file/{model.fileId}?research_id={model.id}"
+
+async def release_research_file(file_id) -> None:
+    # Caches keyed by file_id are shared by every research document using the blob.
+    try:
+        if not await release_file(file_id):
+            return
+    except Exception as e:
+        print(f"⚠️ Failed to release file {file_id}: {e}")
+        return
+    await invalidate_text(file_id)
+    await invalidate_document_summaries(file_id)
+    await invalidate_summary_cache(file_id)
+
 @router.post('/addResearch', response_model=ResearchResponse, status_code=status.HTTP_201_CREATED)
 async def addResearch(
     user_id: str = Query(..., alias="user_id"),
@@ -21,52 +67,119 @@ async def addResearch(
     file: UploadFile = File(...),
 ):
     research_collection = await get_collection(settings.RESEARCH_COLLECTION)
-    bucket = await get_gridfs_bucket()
 
     filename = file.filename or "upload"
     extension = (Path(filename).suffix or "").lstrip(".")
     content_type = file.content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
 
-    grid_in = bucket.open_upload_stream(
-        filename,
-        metadata={
-            "contentType": content_type,
-            "userId": str(user_id),
-            "extension": extension,
-            "researchName": researchName,
-        },
-    )
-
-    try:
-        while True:
-            chunk = await file.read(1024 * 1024)
-            if not chunk:
-                break
-            await grid_in.write(chunk)
-    finally:
-        await grid_in.close()
-
-    file_id = grid_in._id
+    file_id, _ = await store_upload(file, extension)
 
     doc = {
         "user_id": ObjectId(user_id),
         "researchName": researchName,
         "fileName": filename,
+        "nameTokens": name_tokens(researchName, filename),
         "extension": extension,
+        "contentType": content_type,
         "file_id": file_id,
         "createdAt": datetime.now(timezone.utc),
     }
 
-    result = await research_collection.insert_one(doc)
+    try:
+        result = await research_collection.insert_one(doc)
+    except Exception:
+        # Nothing references the blob yet; give back the reference store_upload took.
+        await release_research_file(file_id)
+        raise
     doc["_id"] = result.inserted_id
+    await enqueue_ingestion(result.inserted_id, user_id, file_id)
 
     model = ResearchModel(**doc)
     response = {
         **model.model_dump(by_alias=True),
-        "fileUrl": f"{settings.API_V1_PREFIX}/research/file/{model.fileId}",
+        "fileUrl": file_url(model),
     }
     return response
 
+@router.post('/bulkAddResearch', response_model=BulkResearchResponse, status_code=status.HTTP_200_OK)
+async def bulkAddResearch(
+    user_id: str = Query(..., alias="user_id"),
+    files: List[UploadFile] = File(...),
+):
+    research_collection = await get_collection(settings.RESEARCH_COLLECTION)
+
+    try:
+        uploads = await expand_uploads(files)
+    except BulkUploadError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{e.filename}: {e}")
+
+    semaphore = asyncio.Semaphore(settings.BULK_UPLOAD_CONCURRENCY)
+
+    async def store(upload: UploadFile):
+        filename = upload.filename or "upload"
+        extension = (Path(filename).suffix or "").lstrip(".")
+        content_type = upload.content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        researchName = Path(filename).stem or filename
+        async with semaphore:
+            file_id, duplicate = await store_upload(upload, extension)
+        doc = {
+            "user_id": ObjectId(user_id),
+            "researchName": researchName,
+            "fileName": filename,
+            "nameTokens": name_tokens(researchName, filename),
+            "extension": extension,
+            "contentType": content_type,
+            "file_id": file_id,
+            "createdAt": datetime.now(timezone.utc),
+        }
+        return doc, duplicate
+
+    try:
+        stored = await asyncio.gather(*[store(upload) for upload in uploads], return_exceptions=True)
+    finally:
+        await close_expanded(files, uploads)
+
+    results = []
+    docs = []
+    for upload, outcome in zip(uploads, stored):
+        if isinstance(outcome, BaseException):
+            results.append({"fileName": upload.filename or "upload", "status": "failed", "error": str(outcome)})
+            continue
+        doc, duplicate = outcome
+        results.append({"fileName": doc["fileName"], "status": "created", "duplicate": duplicate, "doc": doc})
+        docs.append(doc)
+
+    insert_errors = {}
+    if docs:
+        try:
+            await research_collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                insert_errors[id(docs[error["index"]])] = error.get("errmsg", "Failed to save research")
+
+    jobs = []
+    for result in results:
+        doc = result.pop("doc", None)
+        if doc is None:
+            continue
+        if id(doc) in insert_errors:
+            await release_research_file(doc["file_id"])
+            result.update({"status": "failed", "error": insert_errors[id(doc)]})
+            continue
+        model = ResearchModel(**doc)
+        result["research"] = {
+            **model.model_dump(by_alias=True),
+            "fileUrl": file_url(model),
+        }
+        jobs.append((doc["_id"], user_id, doc["file_id"]))
+    await enqueue_ingestions(jobs)
+
+    return {
+        "created": len(jobs),
+        "failed": len(results) - len(jobs),
+        "results": results,
+    }
+
 @router.patch("/updateResearch/{id}", response_model=ResearchResponse, status_code=status.HTTP_200_OK)
 async def updateResearch(
     id: str,
@@ -75,7 +188,6 @@ async def updateResearch(
     file: UploadFile | None = File(None), 
 ):
     research_collection = await get_collection(settings.RESEARCH_COLLECTION)
-    bucket = await get_gridfs_bucket()
 
     existing = await research_collection.find_one({
         "_id": ObjectId(id),
@@ -90,56 +202,60 @@ async def updateResearch(
         "updatedAt": datetime.now(timezone.utc),
     }
 
+    file_changed = False
     if file:
-        old_file_id = existing.get("file_id")
-        if old_file_id:
-            try:
-                await bucket.delete(ObjectId(old_file_id))
-            except Exception as e:
-                print(f"⚠️ Failed to delete old file: {e}")
-
         filename = file.filename or "upload"
         extension = (Path(filename).suffix or "").lstrip(".")
         content_type = file.content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
 
-        grid_in = bucket.open_upload_stream(
-            filename,
-            metadata={
-                "contentType": content_type,
-                "userId": str(user_id),
-                "extension": extension,
-                "researchName": researchName,
-            },
-        )
+        file_id, _ = await store_upload(file, extension)
 
-        try:
-            while True:
-                chunk = await file.read(1024 * 1024)
-                if not chunk:
-                    break
-                await grid_in.write(chunk)
-        finally:
-            await grid_in.close()
+        old_file_id = existing.get("file_id")
+        file_changed = file_id != old_file_id
 
         update_fields.update({
             "fileName": filename,
             "extension": extension,
-            "file_id": grid_in._id,
+            "contentType": content_type,
+            "file_id": file_id,
         })
 
-    updated_doc = await research_collection.find_one_and_update(
-        {"_id": ObjectId(id)},
-        {"$set": update_fields},
-        return_document=True,
+    update_fields["nameTokens"] = name_tokens(
+        researchName, update_fields.get("fileName", existing.get("fileName", ""))
     )
 
-    if not updated_doc:
-        raise HTTPException(status_code=500, detail="Failed to update research")
+    try:
+        updated_doc = await research_collection.find_one_and_update(
+            {"_id": ObjectId(id)},
+            {"$set": update_fields},
+            return_document=True,
+        )
+        if not updated_doc:
+            raise HTTPException(status_code=500, detail="Failed to update research")
+    except Exception:
+        # The new file never got attached; give back the reference store_upload took.
+        if file:
+            await release_research_file(file_id)
+        raise
+
+    # Only clean up once file_id is swapped, so a concurrent chat cannot
+    # rebuild an index for the old file after it was invalidated.
+    if file_changed:
+        if old_file_id:
+            await release_research_file(old_file_id)
+        await invalidate_document_index(id)
+        await enqueue_ingestion(id, user_id, updated_doc["file_id"])
+    else:
+        if file and old_file_id:
+            # Unchanged re-upload: drop the extra reference store_upload just took.
+            await release_file(old_file_id)
+        if existing.get("researchName") != researchName:
+            await rename_research(user_id, id, researchName)
 
     model = ResearchModel(**updated_doc)
     response = {
         **model.model_dump(by_alias=True),
-        "fileUrl": f"{settings.API_V1_PREFIX}/research/file/{model.fileId}",
+        "fileUrl": file_url(model),
     }
 
     return response
@@ -148,30 +264,36 @@ async def updateResearch(
 async def deleteResearch(id:str,
     user_id: str = Query(..., alias="user_id"),):
     researchCollection= await get_collection(settings.RESEARCH_COLLECTION)
-    bucket= await get_gridfs_bucket()
     doc_to_delete= await researchCollection.find_one({"_id":ObjectId(id),
                                                       "user_id":ObjectId(user_id)})
     if not doc_to_delete:
          raise HTTPException(status_code=404, detail="Research not found or not owned by user")
-    file_id= doc_to_delete.get("file_id")
-    if file_id:
-        try:
-            await bucket.delete(ObjectId(file_id))
-        except Exception as e:
-            print(f" Failed to delete file: {e}")
-    
+    # Delete the document first: an ingestion job that is mid-write re-checks
+    # it afterwards, so nothing it writes can outlive the cleanup below.
     await researchCollection.delete_one({"_id":ObjectId(id),
                                         "user_id":ObjectId(user_id)})
+
+    file_id= doc_to_delete.get("file_id")
+    if file_id:
+        await release_research_file(file_id)
+    await invalidate_document_index(id)
+    await remove_research(user_id, id)
+    await delete_ingestion(id)
     return {"message": "Research and associated file deleted successfully"}
     
 
 
 @router.get("/", response_model=List[ResearchResponse])
 async def list_research(
+    response: Response,
     user_id: str = Query(..., alias="user_id"),
     limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0),
-    search: str | None = Query(None, description="Search by researchName or fileName (case-insensitive)"),
+    offset: int = Query(0, ge=0, description="Deprecated: prefer cursor, which does not rescan earlier pages"),
+    cursor: str | None = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    search: str | None = Query(None, description="Search researchName and fileName"),
+    search_mode: str = Query("prefix", pattern="^(prefix|text)$",
+                             description="'prefix' matches word starts, newest first; 'text' is full-text search ordered by relevance"),
+    search_body: bool = Query(False, description="Also search the extracted text of the documents (text mode only)"),
     start: datetime | None = Query(None, description="Filter createdAt >= this ISO datetime"),
     end: datetime | None = Query(None, description="Filter createdAt <= this ISO datetime"),
 ):
@@ -180,13 +302,6 @@ async def list_research(
     # Build base query
     query: dict = {"user_id": ObjectId(user_id)}
 
-    # Search filter across researchName and fileName
-    if search:
-        query["$or"] = [
-            {"researchName": {"$regex": search, "$options": "i"}},
-            {"fileName": {"$regex": search, "$options": "i"}},
-        ]
-
     # Time range filtering on createdAt
     created_filter: dict = {}
     if start:
@@ -201,25 +316,78 @@ async def list_research(
     if created_filter:
         query["createdAt"] = created_filter
 
-    cursor = (
+    if search and (search_mode == "text" or search_body):
+        items = []
+        for doc in await search_research(query, search, limit, offset, search_body):
+            model = ResearchModel(**doc)
+            items.append({
+                **model.model_dump(by_alias=True),
+                "fileUrl": file_url(model),
+            })
+        return items
+
+    if search:
+        query.update(prefix_filter(search))
+
+    # Keyset pagination: continue strictly after the last (createdAt, _id) seen
+    if cursor:
+        last_created, last_id = decode_cursor(cursor)
+        query = {"$and": [query, {"$or": [
+            {"createdAt": {"$lt": last_created}},
+            {"createdAt": last_created, "_id": {"$lt": last_id}},
+        ]}]}
+
+    db_cursor = (
         research_collection
         .find(query)
-        .sort("createdAt", -1) 
-        .skip(offset)
-        .limit(limit)
+        .sort([("createdAt", -1), ("_id", -1)])
     )
+    if not cursor and offset:
+        db_cursor = db_cursor.skip(offset)
+    db_cursor = db_cursor.limit(limit)
+
     items = []
-    async for doc in cursor:
+    last_doc = None
+    async for doc in db_cursor:
+        last_doc = doc
         model = ResearchModel(**doc)
         items.append({
             **model.model_dump(by_alias=True),
-            "fileUrl": f"{settings.API_V1_PREFIX}/research/file/{model.fileId}",
+            "fileUrl": file_url(model),
         })
+    if last_doc is not None and len(items) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(last_doc["createdAt"], last_doc["_id"])
     return items
 
 
+@router.get("/{id}/status", status_code=status.HTTP_200_OK)
+async def research_status(
+    id: str,
+    user_id: str = Query(..., alias="user_id"),
+):
+    research_collection = await get_collection(settings.RESEARCH_COLLECTION)
+    research = await research_collection.find_one({"_id": ObjectId(id), "user_id": ObjectId(user_id)}, {"_id": 1})
+    if not research:
+        raise HTTPException(status_code=404, detail="Research not found or not owned by user")
+
+    job = await get_ingestion_status(id)
+    if not job:
+        return {"research_id": id, "status": "unknown"}
+    return {
+        "research_id": id,
+        "status": job.get("status"),
+        "attempts": job.get("attempts", 0),
+        "error": job.get("error"),
+        "updatedAt": job.get("updatedAt"),
+    }
+
+
 @router.get("/file/{file_id}")
-async def download_file(file_id: str):
+async def download_file(
+    file_id: str,
+    request: Request,
+    research_id: str | None = Query(None, description="Research document whose file name and content type to use"),
+):
     bucket = await get_gridfs_bucket()
 
     try:
@@ -227,15 +395,96 @@ async def download_file(file_id: str):
     except Exception:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
 
+    # The blob may back several research documents; name and type come from
+    # the one that was asked for. Files stored before deduplication still
+    # carry them in their GridFS metadata.
+    research_collection = await get_collection(settings.RESEARCH_COLLECTION)
+    query: dict = {"file_id": ObjectId(file_id)}
+    if research_id:
+        query["_id"] = ObjectId(research_id)
+    research = await research_collection.find_one(query, {"fileName": 1, "contentType": 1})
+    if research_id and research is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
     metadata = getattr(grid_out, "metadata", {}) or {}
+    if not isinstance(metadata, dict):
+        metadata = {}
+    if research is not None:
+        filename = research.get("fileName") or grid_out.filename
+        media_type = research.get("contentType") or mimetypes.guess_type(filename)[0]
+    else:
+        filename = grid_out.filename
+        media_type = metadata.get("contentType")
+    media_type = media_type or "application/octet-stream"
+    codec = file_codec(grid_out)
+    length = grid_out.length
+    etag = file_etag(grid_out)
+    last_modified = file_last_modified(grid_out)
+
+    headers = {
+        "Content-Disposition": f"attachment; filename=\"{filename}\"",
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+
+    if codec:
+        # Compressed files are served whole: as stored when the client accepts
+        # the codec, inflated on the fly otherwise. Offsets into the original
+        # bytes cannot be mapped onto the compressed stream, so no Range support.
+        passthrough = accepts_encoding(request.headers.get("accept-encoding"), codec)
+        headers.update({"Accept-Ranges": "none", "Vary": "Accept-Encoding"})
+        if passthrough:
+            headers["ETag"] = etag = f'{etag[:-1]}-{codec}"'
+        if is_not_modified(request.headers, etag, last_modified):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if passthrough:
+            headers.update({"Content-Encoding": codec, "Content-Length": str(length)})
+
+            async def stored_iterator() -> AsyncGenerator[bytes, None]:
+                while True:
+                    chunk = await grid_out.readchunk()
+                    if not chunk:
+                        break
+                    yield chunk
+
+            return StreamingResponse(stored_iterator(), media_type=media_type, headers=headers)
+
+        headers["Content-Length"] = str(original_length(grid_out))
+        return StreamingResponse(iter_file(grid_out), media_type=media_type, headers=headers)
+
+    if is_not_modified(request.headers, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    start, end = 0, length - 1
+    status_code = status.HTTP_200_OK
+    if range_applies(request.headers, etag, last_modified):
+        try:
+            byte_range = parse_byte_range(request.headers.get("range"), length)
+        except ValueError:
+            return Response(
+                status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{length}"},
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(max(0, end - start + 1))
+
+    if start:
+        grid_out.seek(start)
 
     async def file_iterator() -> AsyncGenerator[bytes, None]:
-        while True:
-            chunk = await grid_out.read(1024 * 1024)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await grid_out.read(min(1024 * 1024, remaining))
             if not chunk:
                 break
+            remaining -= len(chunk)
             yield chunk
 
-    media_type = (metadata.get("contentType") if isinstance(metadata, dict) else None) or "application/octet-stream"
-    headers = {"Content-Disposition": f"attachment; filename=\"{grid_out.filename}\""}
-    return StreamingResponse(file_iterator(), media_type=media_type, headers=headers)
+    return StreamingResponse(file_iterator(), status_code=status_code, media_type=media_type, headers=headers)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_serializer
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, timezone
 
 class createResearch(BaseModel):
@@ -29,3 +29,17 @@ class ResearchResponse(BaseModel):
         else:
             value = value.astimezone(timezone.utc)
         return value.isoformat().replace('+00:00', 'Z')
+
+
+class BulkResearchItem(BaseModel):
+    fileName: str
+    status: str
+    duplicate: bool = False
+    error: Optional[str] = None
+    research: Optional[ResearchResponse] = None
+
+
+class BulkResearchResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkResearchItem]
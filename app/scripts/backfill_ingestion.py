@@ -0,0 +1,53 @@
+import asyncio
+from app.database import connect_to_mongo, close_mongo_connection, get_collection
+from app.utils.ingestion import enqueue_ingestions
+from app.indexes import ensure_indexes
+from app.config import settings
+
+# Usage: python -m app.scripts.backfill_ingestion
+#
+# Research uploaded before background ingestion existed has no ingestionJobs
+# entry, and so no libraryChunks or body search text. This queues a job for
+# each such document; the running app's ingestion workers pick them up.
+
+BATCH_SIZE = 500
+
+
+async def queue_missing(batch: list) -> int:
+    jobs_collection = await get_collection(settings.INGESTION_JOBS_COLLECTION)
+    ids = [doc["_id"] for doc in batch]
+    queued = {job["_id"] async for job in jobs_collection.find({"_id": {"$in": ids}}, {"_id": 1})}
+    jobs = [
+        (doc["_id"], doc["user_id"], doc["file_id"])
+        for doc in batch
+        if doc["_id"] not in queued
+    ]
+    await enqueue_ingestions(jobs)
+    return len(jobs)
+
+
+async def main():
+    await connect_to_mongo()
+    try:
+        await ensure_indexes()
+        research_collection = await get_collection(settings.RESEARCH_COLLECTION)
+        cursor = research_collection.find(
+            {"file_id": {"$ne": None}, "user_id": {"$ne": None}},
+            {"_id": 1, "user_id": 1, "file_id": 1},
+        )
+        queued = 0
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= BATCH_SIZE:
+                queued += await queue_missing(batch)
+                batch = []
+        if batch:
+            queued += await queue_missing(batch)
+        print(f"Queued ingestion for {queued} research documents")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,43 @@
+import asyncio
+from pymongo import UpdateOne
+from app.database import connect_to_mongo, close_mongo_connection, get_collection
+from app.utils.research_search import name_tokens
+from app.indexes import ensure_indexes
+from app.config import settings
+
+# Usage: python -m app.scripts.backfill_name_tokens
+#
+# Fills nameTokens, which prefix search matches on, for research created
+# before the field existed.
+
+BATCH_SIZE = 500
+
+
+async def main():
+    await connect_to_mongo()
+    try:
+        await ensure_indexes()
+        research_collection = await get_collection(settings.RESEARCH_COLLECTION)
+        cursor = research_collection.find(
+            {"nameTokens": {"$exists": False}},
+            {"researchName": 1, "fileName": 1},
+        )
+        updated = 0
+        batch = []
+        async for doc in cursor:
+            batch.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"nameTokens": name_tokens(doc.get("researchName", ""), doc.get("fileName", ""))}},
+            ))
+            if len(batch) >= BATCH_SIZE:
+                updated += (await research_collection.bulk_write(batch, ordered=False)).modified_count
+                batch = []
+        if batch:
+            updated += (await research_collection.bulk_write(batch, ordered=False)).modified_count
+        print(f"Added name tokens to {updated} research documents")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,25 @@
+import asyncio
+from app.database import connect_to_mongo, close_mongo_connection, get_collection
+from app.utils.chat_messages import migrate_chat
+from app.indexes import ensure_indexes
+from app.config import settings
+
+# Usage: python -m app.scripts.migrate_chat_messages
+
+
+async def main():
+    await connect_to_mongo()
+    try:
+        await ensure_indexes()
+        chatHistory = await get_collection(settings.CHATHISTORY_COLLECTION)
+        migrated = 0
+        async for chat in chatHistory.find({"bucketed": {"$ne": True}}, {"_id": 1}):
+            if await migrate_chat(chat["_id"]):
+                migrated += 1
+        print(f"Migrated {migrated} chats to bucketed messages")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
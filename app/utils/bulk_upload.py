@@ -0,0 +1,141 @@
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from tempfile import SpooledTemporaryFile
+from pathlib import PurePosixPath
+from typing import List
+import mimetypes
+import asyncio
+import zipfile
+
+from app.config import settings
+
+# Expands a bulk upload into the individual files to store. Zip archives are
+# unpacked member by member into spooled temp files so a large archive never
+# has to sit in memory.
+
+_SPOOL_MEMORY_BYTES = 1024 * 1024
+_COPY_BYTES = 1024 * 1024
+
+
+class BulkUploadError(ValueError):
+    def __init__(self, filename: str, message: str):
+        super().__init__(message)
+        self.filename = filename
+
+
+def _is_zip(file: UploadFile) -> bool:
+    return (file.filename or "").lower().endswith(".zip") or file.content_type in (
+        "application/zip",
+        "application/x-zip-compressed",
+    )
+
+
+def _skip_member(info: zipfile.ZipInfo) -> bool:
+    path = PurePosixPath(info.filename)
+    return info.is_dir() or path.parts[0] == "__MACOSX" or path.name.startswith(".")
+
+
+def _copy_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo, spool, limit: int, message: str) -> int:
+    # Declared sizes can lie, so the limit is also enforced on the bytes actually inflated.
+    copied = 0
+    with zf.open(info) as source:
+        while True:
+            chunk = source.read(_COPY_BYTES)
+            if not chunk:
+                break
+            copied += len(chunk)
+            if copied > limit:
+                raise BulkUploadError(info.filename, message)
+            spool.write(chunk)
+    return copied
+
+
+def _extract_zip(archive, name: str, max_files: int, max_bytes: int) -> tuple[List[tuple[str, SpooledTemporaryFile]], int]:
+    """Unpack an archive into at most max_files members totalling at most max_bytes.
+
+    Returns the members and the number of bytes they hold.
+    """
+    archive.seek(0)
+    members = []
+    total = 0
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            infos = [info for info in zf.infolist() if not _skip_member(info)]
+            # Refuse on the declared counts and sizes before inflating anything
+            if len(infos) > max_files:
+                raise BulkUploadError(name, f"A bulk upload may contain at most {settings.BULK_UPLOAD_MAX_FILES} files")
+            for info in infos:
+                if info.file_size > settings.PARSER_MAX_BYTES:
+                    raise BulkUploadError(info.filename, "File exceeds the upload size limit")
+            if sum(info.file_size for info in infos) > max_bytes:
+                raise BulkUploadError(name, "Archive exceeds the bulk upload size limit")
+
+            for info in infos:
+                spool = SpooledTemporaryFile(max_size=_SPOOL_MEMORY_BYTES)
+                members.append((PurePosixPath(info.filename).name, spool))
+                if max_bytes - total < settings.PARSER_MAX_BYTES:
+                    limit, message = max_bytes - total, "Archive exceeds the bulk upload size limit"
+                else:
+                    limit, message = settings.PARSER_MAX_BYTES, "File exceeds the upload size limit"
+                total += _copy_member(zf, info, spool, limit, message)
+                spool.seek(0)
+    except Exception:
+        for _, spool in members:
+            spool.close()
+        raise
+    return members, total
+
+
+async def expand_uploads(files: List[UploadFile]) -> List[UploadFile]:
+    expanded: List[UploadFile] = []
+    total = 0
+    try:
+        for file in files:
+            name = file.filename or "upload"
+            if not _is_zip(file):
+                expanded.append(file)
+                total += file.size or 0
+            else:
+                members, size = await _expand_zip(
+                    file,
+                    settings.BULK_UPLOAD_MAX_FILES - len(expanded),
+                    settings.BULK_UPLOAD_MAX_TOTAL_BYTES - total,
+                )
+                expanded.extend(members)
+                total += size
+            if len(expanded) > settings.BULK_UPLOAD_MAX_FILES:
+                raise BulkUploadError(
+                    name,
+                    f"A bulk upload may contain at most {settings.BULK_UPLOAD_MAX_FILES} files",
+                )
+            if total > settings.BULK_UPLOAD_MAX_TOTAL_BYTES:
+                raise BulkUploadError(name, "Upload exceeds the bulk upload size limit")
+    except Exception:
+        await close_expanded(files, expanded)
+        raise
+    return expanded
+
+
+async def _expand_zip(file: UploadFile, max_files: int, max_bytes: int) -> tuple[List[UploadFile], int]:
+    name = file.filename or "upload"
+    try:
+        members, size = await asyncio.to_thread(_extract_zip, file.file, name, max_files, max_bytes)
+    except zipfile.BadZipFile:
+        raise BulkUploadError(name, "Not a valid zip archive")
+    uploads = [
+        UploadFile(
+            file=spool,
+            filename=member_name,
+            headers=Headers({"content-type": mimetypes.guess_type(member_name)[0] or "application/octet-stream"}),
+        )
+        for member_name, spool in members
+    ]
+    return uploads, size
+
+
+async def close_expanded(files: List[UploadFile], expanded: List[UploadFile]) -> None:
+    # The request's own uploads are closed by Starlette; zip members are ours.
+    originals = {id(file) for file in files}
+    for upload in expanded:
+        if id(upload) not in originals:
+            await upload.close()
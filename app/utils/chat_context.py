@@ -0,0 +1,127 @@
+from langchain_core.prompts import PromptTemplate
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
+from app.database import get_collection
+from app.config import settings
+from app.utils.llm_scheduler import llm_scheduler
+from app.utils.chat_messages import fetch_messages, migrate_chat
+from app.utils.metrics import timed
+from app.utils.models import model_registry
+from bson import ObjectId
+from typing import List, Optional
+
+_encoding = None
+
+SUMMARY_PROMPT = PromptTemplate(
+    template="""
+    You maintain a running summary of a conversation between a researcher and an AI assistant.
+    Update the summary with the new exchanges below. Keep facts, findings, decisions, names
+    of documents and open questions; drop pleasantries. Reply with the updated summary only.
+
+    CURRENT SUMMARY:
+    {summary}
+
+    NEW EXCHANGES:
+    {exchanges}
+    """,
+    input_variables=['summary', 'exchanges'],
+)
+
+
+def count_tokens(text: str) -> int:
+    # tiktoken's cl100k_base is only an approximation of Gemini's tokenizer,
+    # which is fine for budgeting; fall back to ~4 chars/token if it is unavailable.
+    global _encoding
+    if not text:
+        return 0
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message.get("question", "")) + count_tokens(message.get("response", ""))
+
+
+async def update_rolling_summary(summary: str, messages: List[dict], user_id: Optional[str] = None) -> str:
+    exchanges = "\n\n".join(
+        f"Researcher: {message.get('question', '')}\nAssistant: {message.get('response', '')}"
+        for message in messages
+    )
+    chain = model_registry.chain("chat-summary", settings.CHAT_SUMMARY_MODEL, SUMMARY_PROMPT)
+    return await llm_scheduler.run(
+        user_id,
+        lambda: chain.ainvoke({"summary": summary or "(empty)", "exchanges": exchanges}),
+    )
+
+
+@timed("history")
+async def build_history_messages(chat_id: Optional[str], user_id: str) -> List[BaseMessage]:
+    """Fit the chat history into CHAT_HISTORY_TOKEN_BUDGET.
+
+    The newest turns are replayed verbatim; anything older is folded into a
+    rolling summary stored on the chat document, so each turn only reads the
+    message buckets covering the tail and summarizes what changed since the last one.
+    """
+    if not chat_id:
+        return []
+
+    chatHistoryModel = await get_collection(settings.CHATHISTORY_COLLECTION)
+    # Only the owner's chats may feed the prompt
+    owned = {"_id": ObjectId(chat_id), "user_id": str(user_id)}
+    projection = {"summary": 1, "summarizedCount": 1, "messageCount": 1, "bucketed": 1}
+    chat = await chatHistoryModel.find_one(owned, projection)
+    if not chat:
+        return []
+    if not chat.get("bucketed"):
+        await migrate_chat(chat_id)
+        chat = await chatHistoryModel.find_one(owned, projection)
+
+    total = chat.get("messageCount", 0)
+    tail_start = max(0, total - settings.CHAT_HISTORY_FETCH_LIMIT)
+    tail = await fetch_messages(chat_id, tail_start, total)
+    summary = chat.get("summary", "")
+    summarized = chat.get("summarizedCount", 0)
+
+    budget = settings.CHAT_HISTORY_TOKEN_BUDGET - count_tokens(summary)
+    keep_from = len(tail)
+    used = 0
+    for i in range(len(tail) - 1, -1, -1):
+        if tail_start + i < summarized:
+            break
+        cost = message_tokens(tail[i])
+        if used + cost > budget:
+            break
+        used += cost
+        keep_from = i
+
+    fold_until = tail_start + keep_from
+    if fold_until > summarized:
+        folded = summarized
+        # Messages older than the fetched tail (legacy threads) are folded in batches.
+        while folded < tail_start:
+            batch_end = min(tail_start, folded + settings.CHAT_HISTORY_FETCH_LIMIT)
+            batch = await fetch_messages(chat_id, folded, batch_end)
+            summary = await update_rolling_summary(summary, batch, user_id)
+            folded = batch_end
+        pending = tail[max(0, folded - tail_start):keep_from]
+        if pending:
+            summary = await update_rolling_summary(summary, pending, user_id)
+
+        await chatHistoryModel.update_one(
+            {**owned, "summarizedCount": {"$in": [summarized, None]}},
+            {"$set": {"summary": summary, "summarizedCount": fold_until}},
+        )
+
+    history: List[BaseMessage] = []
+    if summary:
+        history.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+    for message in tail[keep_from:]:
+        history.append(HumanMessage(content=message['question']))
+        history.append(AIMessage(content=message['response']))
+    return history
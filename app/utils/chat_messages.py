@@ -0,0 +1,127 @@
+from pymongo import ReplaceOne, ReturnDocument
+from bson import ObjectId
+from app.database import get_collection
+from app.config import settings
+from datetime import datetime, timedelta, timezone
+from typing import List
+import asyncio
+
+# Messages live outside the chatHistory document, grouped into buckets of
+# CHAT_MESSAGES_BUCKET_SIZE per chat. A message's position in the thread
+# ("index") comes from the chat's messageCount, so its bucket is index // size.
+
+# A migration claim older than this is assumed to belong to a crashed worker
+_MIGRATION_CLAIM_TIMEOUT = timedelta(seconds=30)
+_MIGRATION_POLL_SECONDS = 0.1
+
+
+def bucket_for(index: int) -> int:
+    return index // settings.CHAT_MESSAGES_BUCKET_SIZE
+
+
+async def append_message(chat_id, message: dict) -> int:
+    chatHistory = await get_collection(settings.CHATHISTORY_COLLECTION)
+    chat = await chatHistory.find_one_and_update(
+        {"_id": ObjectId(chat_id)},
+        {"$inc": {"messageCount": 1}},
+        projection={"messageCount": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not chat:
+        raise ValueError(f"Chat with id {chat_id} not found")
+    index = chat["messageCount"] - 1
+
+    collection = await get_collection(settings.CHAT_MESSAGES_COLLECTION)
+    await collection.update_one(
+        {"chat_id": ObjectId(chat_id), "seq": bucket_for(index)},
+        {
+            "$push": {"messages": {**message, "index": index}},
+            "$inc": {"count": 1},
+        },
+        upsert=True,
+    )
+    return index
+
+
+async def fetch_messages(chat_id, start: int, end: int) -> List[dict]:
+    start = max(0, start)
+    if end <= start:
+        return []
+    collection = await get_collection(settings.CHAT_MESSAGES_COLLECTION)
+    cursor = collection.find(
+        {
+            "chat_id": ObjectId(chat_id),
+            "seq": {"$gte": bucket_for(start), "$lte": bucket_for(end - 1)},
+        },
+        {"messages": 1},
+    )
+    messages = []
+    async for bucket in cursor:
+        messages.extend(
+            message for message in bucket.get("messages", [])
+            if start <= message["index"] < end
+        )
+    # Concurrent appends can land in a bucket out of order
+    messages.sort(key=lambda message: message["index"])
+    return messages
+
+
+async def delete_chat_messages(chat_id) -> None:
+    collection = await get_collection(settings.CHAT_MESSAGES_COLLECTION)
+    await collection.delete_many({"chat_id": ObjectId(chat_id)})
+
+
+async def migrate_chat(chat_id) -> bool:
+    """Move a legacy chat's embedded messages array into buckets.
+
+    One caller claims the migration by stamping migratingAt; concurrent callers
+    wait until the chat is bucketed, so nobody appends before messageCount is
+    set. Returns True if this call did the migration.
+    """
+    chatHistory = await get_collection(settings.CHATHISTORY_COLLECTION)
+    while True:
+        claimed_at = datetime.now(timezone.utc)
+        chat = await chatHistory.find_one_and_update(
+            {
+                "_id": ObjectId(chat_id),
+                "bucketed": {"$ne": True},
+                "$or": [
+                    {"migratingAt": None},
+                    {"migratingAt": {"$lt": claimed_at - _MIGRATION_CLAIM_TIMEOUT}},
+                ],
+            },
+            {"$set": {"migratingAt": claimed_at}},
+            projection={"messages": 1},
+        )
+        if chat is not None:
+            break
+        state = await chatHistory.find_one({"_id": ObjectId(chat_id)}, {"bucketed": 1})
+        if not state or state.get("bucketed"):
+            return False
+        await asyncio.sleep(_MIGRATION_POLL_SECONDS)
+
+    messages = chat.get("messages", [])
+    size = settings.CHAT_MESSAGES_BUCKET_SIZE
+    operations = []
+    for start in range(0, len(messages), size):
+        bucket = [
+            {**message, "index": start + offset}
+            for offset, message in enumerate(messages[start:start + size])
+        ]
+        operations.append(ReplaceOne(
+            {"chat_id": chat["_id"], "seq": bucket_for(start)},
+            {"chat_id": chat["_id"], "seq": bucket_for(start), "count": len(bucket), "messages": bucket},
+            upsert=True,
+        ))
+    if operations:
+        collection = await get_collection(settings.CHAT_MESSAGES_COLLECTION)
+        await collection.bulk_write(operations)
+
+    await chatHistory.update_one(
+        {"_id": chat["_id"], "bucketed": {"$ne": True}},
+        {
+            "$set": {"bucketed": True, "messageCount": len(messages)},
+            "$unset": {"messages": "", "migratingAt": ""},
+        },
+    )
+    return True
@@ -0,0 +1,146 @@
+from typing import Optional
+import zlib
+
+from app.config import settings
+
+# Optional at-rest compression for stored research files. gzip is the default;
+# zstd is only used when configured explicitly, since every host that reads
+# the files then needs the zstandard package. The codec is recorded in the
+# GridFS metadata ("compression", "originalLength") so readers can undo it.
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+# Formats that are already compressed gain nothing from a second pass
+INCOMPRESSIBLE_EXTENSIONS = {
+    "docx", "xlsx", "pptx", "zip", "gz", "bz2", "xz", "7z", "rar",
+    "png", "jpg", "jpeg", "gif", "webp", "mp3", "mp4", "mov",
+}
+# Formats viewers fetch by byte range (pdf.js and friends); compressing them
+# would turn every range request into a full download, so they stay as-is
+RANGE_EXTENSIONS = {"pdf"}
+TEXT_EXTENSIONS = {"txt", "md", "csv", "json", "py", "js", "html", "xml", "tex", "tsv"}
+
+_SNIFF_BYTES = 64 * 1024
+
+
+def _zstandard():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def storage_codec() -> Optional[str]:
+    codec = settings.STORAGE_COMPRESSION.lower()
+    if codec in ("none", "off", ""):
+        return None
+    if codec == "auto":
+        return GZIP
+    if codec == ZSTD and _zstandard() is None:
+        return GZIP
+    return codec
+
+
+def choose_codec(extension: str, sample: bytes) -> Optional[str]:
+    """Pick the codec for an upload from its extension, or by sniffing its first bytes."""
+    codec = storage_codec()
+    extension = (extension or "").lower()
+    if codec is None or extension in INCOMPRESSIBLE_EXTENSIONS or extension in RANGE_EXTENSIONS:
+        return None
+    if extension in TEXT_EXTENSIONS:
+        return codec
+    # Unknown formats: compress only if a quick pass over the head pays off
+    sample = sample[:_SNIFF_BYTES]
+    if not sample or sample.startswith(b"%PDF"):
+        return None
+    ratio = len(zlib.compress(sample, 1)) / len(sample)
+    return codec if ratio <= settings.STORAGE_COMPRESSION_MAX_RATIO else None
+
+
+class Compressor:
+    def __init__(self, codec: str):
+        if codec == ZSTD:
+            self._obj = _zstandard().ZstdCompressor(level=settings.STORAGE_COMPRESSION_LEVEL).compressobj()
+        elif codec == GZIP:
+            # wbits=31 writes a gzip container, which is also valid Content-Encoding: gzip
+            level = min(max(settings.STORAGE_COMPRESSION_LEVEL, 1), 9)
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+        else:
+            raise ValueError(f"Unknown compression codec: {codec}")
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+
+class Decompressor:
+    def __init__(self, codec: str):
+        if codec == ZSTD:
+            module = _zstandard()
+            if module is None:
+                raise ValueError("File is zstd-compressed but the zstandard package is not installed")
+            self._obj = module.ZstdDecompressor().decompressobj()
+        elif codec == GZIP:
+            self._obj = zlib.decompressobj(31)
+        else:
+            raise ValueError(f"Unknown compression codec: {codec}")
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._obj.decompress(data)
+
+    def flush(self) -> bytes:
+        # zstd's decompressobj has no flush; everything is returned by decompress()
+        flush = getattr(self._obj, "flush", None)
+        return flush() if flush is not None else b""
+
+
+def file_codec(grid_out) -> Optional[str]:
+    metadata = getattr(grid_out, "metadata", None) or {}
+    return metadata.get("compression") if isinstance(metadata, dict) else None
+
+
+def original_length(grid_out) -> int:
+    metadata = getattr(grid_out, "metadata", None) or {}
+    if isinstance(metadata, dict) and metadata.get("compression"):
+        return metadata.get("originalLength", grid_out.length)
+    return grid_out.length
+
+
+async def iter_file(grid_out):
+    """Yield the stored file's original bytes chunk by chunk."""
+    codec = file_codec(grid_out)
+    decompressor = Decompressor(codec) if codec else None
+    while True:
+        chunk = await grid_out.readchunk()
+        if not chunk:
+            break
+        if decompressor is not None:
+            chunk = decompressor.decompress(chunk)
+            if not chunk:
+                continue
+        yield chunk
+    if decompressor is not None:
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+
+def accepts_encoding(header: Optional[str], codec: str) -> bool:
+    for part in (header or "").split(","):
+        name, *params = part.strip().split(";")
+        if name.strip().lower() != codec:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        return quality > 0
+    return False
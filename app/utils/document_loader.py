@@ -0,0 +1,102 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Union
+import asyncio
+import os
+import tempfile
+
+from app.config import settings
+from app.utils.compression import iter_file, original_length
+from app.utils.metrics import timed
+
+# GridFS files are loaded either into one preallocated buffer of exactly
+# grid_out.length bytes, or spooled to a temp file that the parser workers
+# memory-map. Files handed to the parser pool are always spooled, since a
+# buffer would be pickled into every job; buffers are only used for files read
+# in-process, and only up to the per-request ceiling and while the
+# process-wide budget lasts. Peak memory per load is therefore about 1x the
+# file size for small in-process files and one GridFS chunk otherwise.
+# Compressed files are inflated chunk by chunk on the way in.
+
+DocumentSource = Union[bytearray, str]
+
+
+class MemoryBudget:
+    """Tracks bytes held by in-memory document buffers across concurrent loads."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used = 0
+
+    def try_acquire(self, size: int) -> bool:
+        if self.used + size > self.max_bytes:
+            return False
+        self.used += size
+        return True
+
+    def release(self, size: int) -> None:
+        self.used = max(0, self.used - size)
+
+
+_memory_budget = MemoryBudget(settings.DOCUMENT_LOAD_MEMORY_BUDGET)
+
+
+@timed("gridfs_download")
+async def _read_into_buffer(grid_out, length: int) -> bytearray:
+    buffer = bytearray(length)
+    view = memoryview(buffer)
+    position = 0
+    async for chunk in iter_file(grid_out):
+        if position + len(chunk) > length:
+            view.release()
+            raise ValueError(f"File is longer than its recorded {length} bytes")
+        view[position:position + len(chunk)] = chunk
+        position += len(chunk)
+    view.release()
+    if position != length:
+        raise ValueError(f"File ended after {position} of {length} bytes")
+    return buffer
+
+
+@timed("gridfs_download")
+async def _spool_to_file(grid_out) -> str:
+    fd, path = tempfile.mkstemp(prefix="document-", dir=settings.DOCUMENT_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            async for chunk in iter_file(grid_out):
+                await asyncio.to_thread(spool.write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+@asynccontextmanager
+async def open_document_source(grid_out, in_memory: bool = True) -> AsyncIterator[DocumentSource]:
+    """Yield the file as a bytearray, or as a temp file path removed on exit.
+
+    Pass in_memory=False for files that go to the parser processes.
+    """
+    length = original_length(grid_out)
+    if (
+        in_memory
+        and length <= settings.DOCUMENT_LOAD_MEMORY_LIMIT
+        and _memory_budget.try_acquire(length)
+    ):
+        try:
+            yield await _read_into_buffer(grid_out, length)
+        finally:
+            _memory_budget.release(length)
+        return
+
+    path = await _spool_to_file(grid_out)
+    try:
+        yield path
+    finally:
+        os.unlink(path)
+
+
+def read_text_source(source: DocumentSource) -> str:
+    if isinstance(source, str):
+        with open(source, "r", encoding="utf-8", errors="ignore") as file:
+            return file.read()
+    return source.decode("utf-8", errors="ignore")
@@ -0,0 +1,110 @@
+from langchain_core.embeddings import Embeddings
+from pymongo import UpdateOne
+from bson import Binary
+from app.database import get_collection
+from app.config import settings
+from app.utils.llm_scheduler import llm_scheduler
+from app.utils.metrics import timed
+from datetime import datetime, timezone
+from typing import List, Optional
+import numpy as np
+import hashlib
+
+_LOOKUP_BATCH_SIZE = 1000
+
+
+def embedding_key(model_name: str, text: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def encode_vector(vector: List[float]) -> Binary:
+    return Binary(np.asarray(vector, dtype=np.float32).tobytes())
+
+
+def decode_vector(data: bytes) -> List[float]:
+    return np.frombuffer(data, dtype=np.float32).tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends chunks it has never seen to the model.
+
+    Vectors are stored in Mongo keyed by a hash of (model name, chunk text), so
+    identical chunks across documents, revisions and transcripts are embedded once.
+    """
+
+    def __init__(self, embedding: Embeddings, model_name: str, user_id: Optional[str] = None):
+        self.embedding = embedding
+        self.model_name = model_name
+        self.user_id = user_id
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embedding.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedding.embed_query(text)
+
+    @timed("embed_query")
+    async def aembed_query(self, text: str) -> List[float]:
+        return await llm_scheduler.run(self.user_id, lambda: self.embedding.aembed_query(text))
+
+    @timed("embed_documents")
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        keys = [embedding_key(self.model_name, text) for text in texts]
+        vectors = await self._lookup(set(keys))
+
+        missing: dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        if missing:
+            new_vectors = await llm_scheduler.run(
+                self.user_id,
+                lambda: self.embedding.aembed_documents(list(missing.values())),
+            )
+            fresh = dict(zip(missing.keys(), new_vectors))
+            await self._store(fresh)
+            vectors.update(fresh)
+
+        return [vectors[key] for key in keys]
+
+    async def _lookup(self, keys: set) -> dict[str, List[float]]:
+        collection = await get_collection(settings.EMBEDDING_CACHE_COLLECTION)
+        keys = list(keys)
+        found: dict[str, List[float]] = {}
+        for i in range(0, len(keys), _LOOKUP_BATCH_SIZE):
+            cursor = collection.find(
+                {"_id": {"$in": keys[i:i + _LOOKUP_BATCH_SIZE]}},
+                {"vector": 1},
+            )
+            async for doc in cursor:
+                found[doc["_id"]] = decode_vector(doc["vector"])
+        return found
+
+    async def _store(self, vectors: dict[str, List[float]]) -> None:
+        collection = await get_collection(settings.EMBEDDING_CACHE_COLLECTION)
+        now = datetime.now(timezone.utc)
+        operations = [
+            UpdateOne(
+                {"_id": key},
+                {"$setOnInsert": {
+                    "model": self.model_name,
+                    "dim": len(vector),
+                    "vector": encode_vector(vector),
+                    "createdAt": now,
+                }},
+                upsert=True,
+            )
+            for key, vector in vectors.items()
+        ]
+        try:
+            await collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            print(f"Failed to store embeddings in cache: {e}")
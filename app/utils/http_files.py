@@ -0,0 +1,103 @@
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional
+
+# Helpers for conditional and partial GETs of GridFS files. Stored files are
+# immutable (a re-upload gets a new _id), so the file id plus md5/length is a
+# strong validator.
+
+
+def file_etag(grid_out) -> str:
+    md5 = getattr(grid_out, "md5", None)
+    return f'"{grid_out._id}-{md5 or grid_out.length}"'
+
+
+def file_last_modified(grid_out) -> Optional[datetime]:
+    upload_date = getattr(grid_out, "upload_date", None)
+    if upload_date is None:
+        return None
+    if upload_date.tzinfo is None:
+        upload_date = upload_date.replace(tzinfo=timezone.utc)
+    # HTTP dates have one-second resolution
+    return upload_date.replace(microsecond=0)
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def parse_http_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def etag_matches(header: str, etag: str, weak: bool = True) -> bool:
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def is_not_modified(headers, etag: str, last_modified: Optional[datetime]) -> bool:
+    # If-None-Match takes precedence; If-Modified-Since is only consulted without it.
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    since = parse_http_date(headers.get("if-modified-since"))
+    return since is not None and last_modified is not None and last_modified <= since
+
+
+def range_applies(headers, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_range = headers.get("if-range")
+    if not if_range:
+        return True
+    if if_range.strip().startswith(('"', "W/")):
+        return etag_matches(if_range, etag, weak=False)
+    since = parse_http_date(if_range)
+    return since is not None and last_modified is not None and last_modified == since
+
+
+def parse_byte_range(header: Optional[str], length: int) -> Optional[tuple[int, int]]:
+    """Return the inclusive (start, end) of a single byte range.
+
+    None means the header should be ignored and the whole file served, which
+    is also how multi-range requests are answered. ValueError means the range
+    cannot be satisfied.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    first, last = first.strip(), last.strip()
+    if not (first or last) or any(part and not part.isdigit() for part in (first, last)):
+        return None
+    if length == 0:
+        raise ValueError("Empty file")
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, length - suffix), length - 1
+    start = int(first)
+    end = int(last) if last else length - 1
+    if start > end and last:
+        return None
+    if start >= length:
+        raise ValueError("Range starts past the end of the file")
+    return start, min(end, length - 1)
@@ -0,0 +1,112 @@
+from langchain_core.embeddings import Embeddings
+from gridfs.errors import NoFile
+from app.database import get_gridfs_bucket
+from app.config import settings
+from app.utils.lru import ByteLRUCache
+from app.utils.metrics import timed
+from typing import TYPE_CHECKING, Optional
+import asyncio
+import weakref
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+# Serialized FAISS indexes live in their own GridFS bucket, one file per
+# (research _id, file_id); the LRU keeps the hottest ones deserialized. Research
+# documents that share a deduplicated file reuse each other's index.
+_index_cache = ByteLRUCache(settings.DOCUMENT_INDEX_CACHE_BYTES)
+# Locks are only held while a build runs, so unused ones are dropped with their last reference
+_build_locks: "weakref.WeakValueDictionary[tuple[str, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _index_key(research_id, file_id) -> tuple[str, str]:
+    return (str(research_id), str(file_id))
+
+
+def _index_filename(key: tuple[str, str]) -> str:
+    return f"{key[0]}/{key[1]}"
+
+
+def get_build_lock(research_id, file_id) -> asyncio.Lock:
+    key = _index_key(research_id, file_id)
+    lock = _build_locks.get(key)
+    if lock is None:
+        lock = _build_locks[key] = asyncio.Lock()
+    return lock
+
+
+@timed("index_load")
+async def load_document_index(research_id, file_id, embedding: Embeddings) -> Optional["FAISS"]:
+    key = _index_key(research_id, file_id)
+    vector_store = _index_cache.get(key)
+    if vector_store is not None:
+        return vector_store
+
+    bucket = await get_gridfs_bucket(settings.DOCUMENT_INDEX_BUCKET)
+    try:
+        grid_out = await bucket.open_download_stream_by_name(_index_filename(key))
+    except NoFile:
+        return None
+    serialized = await grid_out.read()
+
+    from langchain_community.vectorstores import FAISS
+    vector_store = FAISS.deserialize_from_bytes(
+        serialized,
+        embedding,
+        allow_dangerous_deserialization=True,
+    )
+    _index_cache.put(key, vector_store, len(serialized))
+    return vector_store
+
+
+async def load_shared_document_index(file_id, embedding: Embeddings) -> Optional["FAISS"]:
+    """Load an index built for the same stored file by another research document."""
+    bucket = await get_gridfs_bucket(settings.DOCUMENT_INDEX_BUCKET)
+    cursor = bucket.find({"metadata.file_id": str(file_id)}).limit(1)
+    async for grid_out in cursor:
+        serialized = await grid_out.read()
+        from langchain_community.vectorstores import FAISS
+        return FAISS.deserialize_from_bytes(
+            serialized,
+            embedding,
+            allow_dangerous_deserialization=True,
+        )
+    return None
+
+
+async def save_document_index(research_id, file_id, vector_store: "FAISS") -> None:
+    key = _index_key(research_id, file_id)
+    serialized = vector_store.serialize_to_bytes()
+
+    bucket = await get_gridfs_bucket(settings.DOCUMENT_INDEX_BUCKET)
+    await bucket.upload_from_stream(
+        _index_filename(key),
+        serialized,
+        metadata={"research_id": key[0], "file_id": key[1]},
+    )
+    _index_cache.put(key, vector_store, len(serialized))
+
+
+async def delete_document_index(research_id, file_id) -> None:
+    """Drop the index saved for one (research, file) pair."""
+    key = _index_key(research_id, file_id)
+    _index_cache.pop(key)
+    bucket = await get_gridfs_bucket(settings.DOCUMENT_INDEX_BUCKET)
+    async for grid_out in bucket.find({"filename": _index_filename(key)}):
+        try:
+            await bucket.delete(grid_out._id)
+        except NoFile:
+            pass
+
+
+async def invalidate_document_index(research_id) -> None:
+    research_id = str(research_id)
+    _index_cache.discard_where(lambda key: key[0] == research_id)
+
+    bucket = await get_gridfs_bucket(settings.DOCUMENT_INDEX_BUCKET)
+    cursor = bucket.find({"metadata.research_id": research_id})
+    async for grid_out in cursor:
+        try:
+            await bucket.delete(grid_out._id)
+        except NoFile:
+            pass
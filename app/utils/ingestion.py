@@ -0,0 +1,176 @@
+from pymongo import ReturnDocument, UpdateOne
+from bson import ObjectId
+from app.database import get_collection
+from app.config import settings
+from app.utils.rag_utils import get_document_retriever, index_research_library, is_current_file
+from app.utils.text_cache import share_text
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import asyncio
+
+# Ingestion jobs are persisted in Mongo, one per research document (_id is the
+# research _id), so pending work survives restarts. A job claimed by a worker
+# that died is picked up again once its lease expires.
+
+PENDING = "pending"
+PROCESSING = "processing"
+READY = "ready"
+FAILED = "failed"
+
+
+def _enqueue_update(user_id, file_id, now: datetime) -> dict:
+    return {
+        "$set": {
+            "user_id": ObjectId(user_id),
+            "file_id": ObjectId(file_id),
+            "status": PENDING,
+            "attempts": 0,
+            "error": None,
+            "leaseUntil": None,
+            "updatedAt": now,
+        },
+        "$setOnInsert": {"createdAt": now},
+    }
+
+
+async def enqueue_ingestion(research_id, user_id, file_id) -> None:
+    collection = await get_collection(settings.INGESTION_JOBS_COLLECTION)
+    now = datetime.now(timezone.utc)
+    await collection.update_one(
+        {"_id": ObjectId(research_id)},
+        _enqueue_update(user_id, file_id, now),
+        upsert=True,
+    )
+    ingestion_worker.notify()
+
+
+async def enqueue_ingestions(jobs: List[tuple]) -> None:
+    """Queue many (research_id, user_id, file_id) jobs in one round trip."""
+    if not jobs:
+        return
+    collection = await get_collection(settings.INGESTION_JOBS_COLLECTION)
+    now = datetime.now(timezone.utc)
+    await collection.bulk_write([
+        UpdateOne({"_id": ObjectId(research_id)}, _enqueue_update(user_id, file_id, now), upsert=True)
+        for research_id, user_id, file_id in jobs
+    ], ordered=False)
+    ingestion_worker.notify()
+
+
+async def delete_ingestion(research_id) -> None:
+    collection = await get_collection(settings.INGESTION_JOBS_COLLECTION)
+    await collection.delete_one({"_id": ObjectId(research_id)})
+
+
+async def get_ingestion_status(research_id) -> Optional[dict]:
+    collection = await get_collection(settings.INGESTION_JOBS_COLLECTION)
+    return await collection.find_one(
+        {"_id": ObjectId(research_id)},
+        {"status": 1, "attempts": 1, "error": 1, "createdAt": 1, "updatedAt": 1},
+    )
+
+
+async def claim_job() -> Optional[dict]:
+    collection = await get_collection(settings.INGESTION_JOBS_COLLECTION)
+    now = datetime.now(timezone.utc)
+    return await collection.find_one_and_update(
+        {"$or": [
+            {"status": PENDING},
+            {"status": PROCESSING, "leaseUntil": {"$lt": now}},
+        ]},
+        {
+            "$set": {
+                "status": PROCESSING,
+                "leaseUntil": now + timedelta(seconds=settings.INGESTION_LEASE_SECONDS),
+                "updatedAt": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("updatedAt", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def ingest_research(job: dict) -> None:
+    research_id = str(job["_id"])
+    user_id = str(job["user_id"])
+    # The research was deleted or given another file since this job was queued
+    if not await is_current_file(research_id, job["file_id"]):
+        return
+    # Extracts and caches the text, then builds and persists the document's FAISS index.
+    # For a deduplicated upload all of this is served from the file_id-keyed caches.
+    await get_document_retriever(research_id, user_id)
+    await share_text(job["file_id"], user_id)
+    await index_research_library(research_id, job["file_id"])
+
+
+async def finish_job(job: dict, error: Optional[Exception] = None) -> None:
+    collection = await get_collection(settings.INGESTION_JOBS_COLLECTION)
+    if error is None:
+        update = {"status": READY, "error": None}
+    elif job.get("attempts", 1) < settings.INGESTION_MAX_ATTEMPTS:
+        update = {"status": PENDING, "error": str(error)}
+    else:
+        update = {"status": FAILED, "error": str(error)}
+    update.update({"leaseUntil": None, "updatedAt": datetime.now(timezone.utc)})
+
+    # Only finish the version we processed; a re-upload meanwhile re-queued the job.
+    await collection.update_one(
+        {"_id": job["_id"], "file_id": job["file_id"], "status": PROCESSING},
+        {"$set": update},
+    )
+
+
+class IngestionWorker:
+    def __init__(self, concurrency: int, poll_interval: float):
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                job = await claim_job()
+            except Exception as e:
+                print(f"⚠️ Failed to claim ingestion job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            error = None
+            try:
+                await ingest_research(job)
+            except Exception as e:
+                print(f"⚠️ Ingestion failed for research {job['_id']}: {e}")
+                error = e
+            try:
+                await finish_job(job, error)
+            except Exception as e:
+                print(f"⚠️ Failed to record ingestion result for research {job['_id']}: {e}")
+
+
+ingestion_worker = IngestionWorker(
+    concurrency=settings.INGESTION_WORKERS,
+    poll_interval=settings.INGESTION_POLL_SECONDS,
+)
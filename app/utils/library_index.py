@@ -0,0 +1,213 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from pymongo import InsertOne, ReturnDocument
+from bson import ObjectId
+from app.database import get_collection
+from app.config import settings
+from app.utils.embedding_cache import encode_vector, decode_vector
+from app.utils.lru import ByteLRUCache
+from app.utils.metrics import timed
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional
+import asyncio
+import weakref
+
+# Every chunk of every research document a user owns lives in libraryChunks
+# with its vector. A per-user FAISS index is built from that collection on
+# first use, kept in a byte-bounded LRU, and patched in place as documents
+# are added, replaced or deleted.
+#
+# Ingestion may run in another worker process, so every change also bumps the
+# user's version in libraryVersions. Cached indexes remember the version they
+# reflect and are only served while it is still current.
+
+_library_cache = ByteLRUCache(settings.LIBRARY_INDEX_CACHE_BYTES)
+_library_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _chunk_id(research_id, index: int) -> str:
+    return f"{research_id}:{index}"
+
+
+def _estimate_size(texts: List[str], dim: int) -> int:
+    return len(texts) * dim * 4 + sum(len(text) for text in texts)
+
+
+async def _current_version(user_id: str) -> int:
+    versions = await get_collection(settings.LIBRARY_VERSIONS_COLLECTION)
+    doc = await versions.find_one({"_id": ObjectId(user_id)}, {"version": 1})
+    return doc["version"] if doc else 0
+
+
+async def _bump_version(user_id: str) -> int:
+    versions = await get_collection(settings.LIBRARY_VERSIONS_COLLECTION)
+    doc = await versions.find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        {"$inc": {"version": 1}, "$set": {"updatedAt": datetime.now(timezone.utc)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["version"]
+
+
+def _cached_at(user_id: str, version: int):
+    """The cached index if it reflects exactly the given version."""
+    entry = _library_cache.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    return None
+
+
+async def _load_library(user_id: str, embedding: Embeddings):
+    collection = await get_collection(settings.LIBRARY_CHUNKS_COLLECTION)
+    cursor = collection.find(
+        {"user_id": ObjectId(user_id)},
+        {"text": 1, "vector": 1, "research_id": 1, "researchName": 1, "chunk": 1},
+    )
+    text_embeddings, metadatas, ids = [], [], []
+    async for doc in cursor:
+        text_embeddings.append((doc["text"], decode_vector(doc["vector"])))
+        metadatas.append({
+            "research_id": str(doc["research_id"]),
+            "researchName": doc.get("researchName"),
+            "chunk": doc.get("chunk"),
+        })
+        ids.append(doc["_id"])
+    if not text_embeddings:
+        return None, 0
+    from langchain_community.vectorstores import FAISS
+    vector_store = FAISS.from_embeddings(text_embeddings, embedding, metadatas=metadatas, ids=ids)
+    dim = len(text_embeddings[0][1])
+    return vector_store, _estimate_size([text for text, _ in text_embeddings], dim)
+
+
+@timed("library_index_load")
+async def get_library_index(user_id: str, embedding: Embeddings):
+    user_id = str(user_id)
+    version = await _current_version(user_id)
+    vector_store = _cached_at(user_id, version)
+    if vector_store is not None:
+        return vector_store
+
+    lock = _library_locks.get(user_id)
+    if lock is None:
+        lock = _library_locks[user_id] = asyncio.Lock()
+    async with lock:
+        version = await _current_version(user_id)
+        vector_store = _cached_at(user_id, version)
+        if vector_store is not None:
+            return vector_store
+        _library_cache.pop(user_id)
+        vector_store, size = await _load_library(user_id, embedding)
+        # Only cache if no add/delete raced with the load; otherwise the next query reloads.
+        if vector_store is not None and await _current_version(user_id) == version:
+            _library_cache.put(user_id, (version, vector_store), size)
+        return vector_store
+
+
+async def index_chunks(
+    user_id,
+    research_id,
+    file_id,
+    research_name: str,
+    chunks: List[str],
+    embedding: Embeddings,
+    still_current: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> int:
+    """Replace a research document's chunks.
+
+    still_current is checked once the chunks are embedded, right before they
+    are written; when it returns False nothing is written.
+    """
+    user_id = str(user_id)
+    await remove_research(user_id, research_id)
+    if not chunks:
+        return 0
+
+    vectors = await embedding.aembed_documents(chunks)
+    if still_current is not None and not await still_current():
+        return 0
+    now = datetime.now(timezone.utc)
+    ids = [_chunk_id(research_id, i) for i in range(len(chunks))]
+    collection = await get_collection(settings.LIBRARY_CHUNKS_COLLECTION)
+    await collection.bulk_write([
+        InsertOne({
+            "_id": chunk_id,
+            "user_id": ObjectId(user_id),
+            "research_id": ObjectId(research_id),
+            "file_id": ObjectId(file_id),
+            "researchName": research_name,
+            "chunk": i,
+            "text": text,
+            "vector": encode_vector(vector),
+            "createdAt": now,
+        })
+        for i, (chunk_id, text, vector) in enumerate(zip(ids, chunks, vectors))
+    ], ordered=False)
+
+    # Patch the cached index only if it was current before this change
+    version = await _bump_version(user_id)
+    vector_store = _cached_at(user_id, version - 1)
+    if vector_store is None:
+        _library_cache.pop(user_id)
+    else:
+        metadatas = [
+            {"research_id": str(research_id), "researchName": research_name, "chunk": i}
+            for i in range(len(chunks))
+        ]
+        vector_store.add_embeddings(list(zip(chunks, vectors)), metadatas=metadatas, ids=ids)
+        _library_cache.put(
+            user_id,
+            (version, vector_store),
+            _library_cache.size_of(user_id) + _estimate_size(chunks, len(vectors[0])),
+        )
+    return len(chunks)
+
+
+async def remove_research(user_id, research_id, file_id=None) -> int:
+    """Drop a research document's chunks, or only those built from file_id."""
+    user_id = str(user_id)
+    collection = await get_collection(settings.LIBRARY_CHUNKS_COLLECTION)
+    query = {"research_id": ObjectId(research_id)}
+    if file_id is not None:
+        query["file_id"] = ObjectId(file_id)
+    ids = [doc["_id"] async for doc in collection.find(query, {"_id": 1})]
+    if not ids:
+        return 0
+    await collection.delete_many(query)
+
+    version = await _bump_version(user_id)
+    vector_store = _cached_at(user_id, version - 1)
+    if vector_store is None:
+        _library_cache.pop(user_id)
+    else:
+        indexed = set(vector_store.index_to_docstore_id.values())
+        present = [chunk_id for chunk_id in ids if chunk_id in indexed]
+        if len(present) == len(vector_store.index_to_docstore_id):
+            _library_cache.pop(user_id)
+        else:
+            if present:
+                vector_store.delete(present)
+            _library_cache.put(user_id, (version, vector_store), _library_cache.size_of(user_id))
+    return len(ids)
+
+
+async def rename_research(user_id, research_id, research_name: str) -> None:
+    collection = await get_collection(settings.LIBRARY_CHUNKS_COLLECTION)
+    result = await collection.update_many(
+        {"research_id": ObjectId(research_id)},
+        {"$set": {"researchName": research_name}},
+    )
+    if result.modified_count:
+        await _bump_version(str(user_id))
+        _library_cache.pop(str(user_id))
+
+
+@timed("library_search")
+async def search_library(user_id, question: str, embedding: Embeddings, k: int) -> List[Document]:
+    vector_store = await get_library_index(user_id, embedding)
+    if vector_store is None:
+        return []
+    query_vector = await embedding.aembed_query(question)
+    results = vector_store.similarity_search_with_score_by_vector(query_vector, k=k)
+    return [doc for doc, _ in results]
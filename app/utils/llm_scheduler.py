@@ -0,0 +1,167 @@
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+from app.config import settings
+import asyncio
+import random
+import time
+
+T = TypeVar("T")
+
+ANONYMOUS_USER = "anonymous"
+
+_RATE_LIMIT_MARKERS = ("429", "resource_exhausted", "resource exhausted", "rate limit", "quota")
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    try:
+        from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+        if isinstance(error, (ResourceExhausted, TooManyRequests)):
+            return True
+    except ImportError:
+        pass
+    message = str(error).lower()
+    return any(marker in message for marker in _RATE_LIMIT_MARKERS)
+
+
+class LLMScheduler:
+    """Gates every model call behind a global in-flight cap with round-robin fairness across users.
+
+    Waiting callers are queued per user and slots are handed out one user at a
+    time, so a single user's burst cannot starve everyone else. Rate-limit
+    errors are retried with jittered exponential backoff outside the slot.
+    """
+
+    def __init__(self, max_concurrency: int, max_retries: int, base_delay: float, max_delay: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._in_flight = 0
+        self._waiting: "OrderedDict[str, deque[asyncio.Future]]" = OrderedDict()
+        self._wait_times: deque[float] = deque(maxlen=1000)
+        self._completed = 0
+        self._retries = 0
+
+    async def acquire(self, user_id: Optional[str]) -> None:
+        user_id = user_id or ANONYMOUS_USER
+        if self._in_flight < self.max_concurrency and not self._waiting:
+            self._in_flight += 1
+            self._wait_times.append(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user_id, deque()).append(future)
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we were cancelled; pass it on.
+                self.release()
+            else:
+                self._remove_waiter(user_id, future)
+            raise
+        self._wait_times.append(time.monotonic() - started)
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        self._completed += 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.max_concurrency and self._waiting:
+            user_id, queue = next(iter(self._waiting.items()))
+            future = queue.popleft()
+            if queue:
+                self._waiting.move_to_end(user_id)
+            else:
+                del self._waiting[user_id]
+            if future.done():
+                continue
+            self._in_flight += 1
+            future.set_result(None)
+
+    def _remove_waiter(self, user_id: str, future: asyncio.Future) -> None:
+        queue = self._waiting.get(user_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del self._waiting[user_id]
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str]):
+        await self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self, user_id: Optional[str], call: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            try:
+                async with self.slot(user_id):
+                    return await call()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+            self._retries += 1
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def stream(self, user_id: Optional[str], make_stream: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        # Only retry while nothing has been yielded; a half-sent stream cannot be replayed.
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async with self.slot(user_id):
+                    async for item in make_stream():
+                        started = True
+                        yield item
+                    return
+            except Exception as e:
+                if started or not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+            self._retries += 1
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def stats(self) -> dict:
+        waits = sorted(self._wait_times)
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))]
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "queue_depth": sum(len(queue) for queue in self._waiting.values()),
+            "queue_depth_by_user": {user: len(queue) for user, queue in self._waiting.items()},
+            "completed": self._completed,
+            "retries": self._retries,
+            "wait_seconds": {
+                "p50": percentile(0.50),
+                "p99": percentile(0.99),
+                "max": waits[-1] if waits else 0.0,
+            },
+        }
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    max_retries=settings.LLM_MAX_RETRIES,
+    base_delay=settings.LLM_RETRY_BASE_SECONDS,
+    max_delay=settings.LLM_RETRY_MAX_SECONDS,
+)
@@ -0,0 +1,93 @@
+from functools import lru_cache
+from typing import Callable, Optional
+import threading
+
+# Process-wide registry of model clients and prebuilt chains. Each chat model
+# and embedding client is constructed once per model name and reused, so its
+# HTTP connections are pooled across requests. Provider packages are imported
+# on first use rather than at startup.
+
+
+def _google_chat_model(model: str):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=model)
+
+
+def _google_embeddings(model: str):
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model=model)
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        chat_factory: Callable = _google_chat_model,
+        embeddings_factory: Callable = _google_embeddings,
+    ):
+        self.chat_factory = chat_factory
+        self.embeddings_factory = embeddings_factory
+        self._chat_models: dict = {}
+        self._embeddings: dict = {}
+        self._chains: dict = {}
+        self._lock = threading.RLock()
+        self._env_loaded = False
+
+    def _load_env(self) -> None:
+        # The provider clients read their API keys from the environment
+        if not self._env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            self._env_loaded = True
+
+    def chat_model(self, model: str):
+        with self._lock:
+            llm = self._chat_models.get(model)
+            if llm is None:
+                self._load_env()
+                llm = self._chat_models[model] = self.chat_factory(model=model)
+            return llm
+
+    def embeddings(self, model: str):
+        with self._lock:
+            embedding = self._embeddings.get(model)
+            if embedding is None:
+                self._load_env()
+                embedding = self._embeddings[model] = self.embeddings_factory(model=model)
+            return embedding
+
+    def chain(self, name: str, model: str, prompt=None):
+        """Return the cached `prompt | llm | StrOutputParser()` chain registered under name."""
+        key = (name, model)
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is None:
+                from langchain_core.output_parsers import StrOutputParser
+                chain = self.chat_model(model) | StrOutputParser()
+                if prompt is not None:
+                    chain = prompt | chain
+                self._chains[key] = chain
+            return chain
+
+    def use(self, chat_factory: Optional[Callable] = None, embeddings_factory: Optional[Callable] = None) -> None:
+        """Swap the client factories (e.g. for fakes) and drop everything built so far."""
+        with self._lock:
+            if chat_factory is not None:
+                self.chat_factory = chat_factory
+            if embeddings_factory is not None:
+                self.embeddings_factory = embeddings_factory
+            self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._chat_models.clear()
+            self._embeddings.clear()
+            self._chains.clear()
+
+
+model_registry = ModelRegistry()
+
+
+@lru_cache(maxsize=None)
+def get_text_splitter(chunk_size: int, chunk_overlap: int):
+    from langchain_classic.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
@@ -0,0 +1,192 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import List, Optional, Union
+import multiprocessing
+import asyncio
+import mmap
+import csv
+import io
+import os
+
+from app.config import settings
+from app.utils.metrics import timed
+
+# A source is either the file bytes or the path of a spooled temp file; paths
+# keep large files out of the pickled job arguments.
+Source = Union[bytes, bytearray, str]
+
+# The functions below run inside the worker processes. They are kept at module
+# level so they can be pickled by reference.
+
+@contextmanager
+def _open_source(source: Source, mapped: bool = True):
+    if not isinstance(source, str):
+        yield io.BytesIO(source)
+        return
+    with open(source, "rb") as file:
+        # zipfile (docx) needs a real file object; PyPDF2 is happy with the map
+        if not mapped or os.fstat(file.fileno()).st_size == 0:
+            yield file
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def _pdf_page_count(source: Source) -> int:
+    from PyPDF2 import PdfReader
+    with _open_source(source) as stream:
+        return len(PdfReader(stream).pages)
+
+
+def _extract_pdf_pages(source: Source, start: int, end: int) -> List[str]:
+    from PyPDF2 import PdfReader
+    with _open_source(source) as stream:
+        reader = PdfReader(stream)
+        return [(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def _extract_docx(source: Source) -> str:
+    from docx import Document as DocxDocument
+    with _open_source(source, mapped=False) as stream:
+        doc = DocxDocument(stream)
+        return "\n\n".join([paragraph.text for paragraph in doc.paragraphs])
+
+
+def _extract_csv(source: Source) -> str:
+    if isinstance(source, str):
+        text_stream = open(source, "r", encoding="utf-8", errors="ignore", newline="")
+    else:
+        text_stream = io.StringIO(source.decode('utf-8', errors='ignore'))
+    with text_stream:
+        rows = [", ".join(row) for row in csv.reader(text_stream)]
+    return "\n".join(rows)
+
+
+def _ready() -> bool:
+    return True
+
+
+def _source_size(source: Source) -> int:
+    return os.path.getsize(source) if isinstance(source, str) else len(source)
+
+
+class ParsingEngine:
+    """Runs CPU-bound document extraction on a bounded process pool so the event loop stays free."""
+
+    def __init__(
+        self,
+        workers: int,
+        timeout: float,
+        max_pages: int,
+        max_bytes: int,
+        pages_per_job: int,
+    ):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.pages_per_job = max(1, pages_per_job)
+        # One single-worker pool per lane, so a hung or crashed job only takes
+        # down its own process; jobs wait for a free lane rather than queueing
+        # inside a pool that may have to be killed.
+        self._executors: List[Optional[ProcessPoolExecutor]] = [None] * self.workers
+        self._lanes: Optional[asyncio.Queue] = None
+        self._lanes_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_lanes(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._lanes is None or self._lanes_loop is not loop:
+            self._lanes = asyncio.Queue()
+            for lane in range(self.workers):
+                self._lanes.put_nowait(lane)
+            self._lanes_loop = loop
+        return self._lanes
+
+    async def _get_executor(self, lane: int) -> ProcessPoolExecutor:
+        if self._executors[lane] is None:
+            # spawn keeps the workers free of the parent's Mongo client threads
+            executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            # Start the worker up front so its start-up is not charged to the job's timeout
+            await asyncio.get_running_loop().run_in_executor(executor, _ready)
+            self._executors[lane] = executor
+        return self._executors[lane]
+
+    def _discard_executor(self, lane: int) -> None:
+        # A timed-out job keeps its worker busy and a crashed worker breaks its
+        # pool; kill that one process and let the lane start afresh.
+        executor, self._executors[lane] = self._executors[lane], None
+        if executor is None:
+            return
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        lanes = self._get_lanes()
+        lane = await lanes.get()
+        try:
+            future = loop.run_in_executor(await self._get_executor(lane), fn, *args)
+            try:
+                return await asyncio.wait_for(future, timeout=self.timeout)
+            except asyncio.TimeoutError:
+                self._discard_executor(lane)
+                raise ValueError(f"Document parsing timed out after {self.timeout} seconds")
+            except BrokenProcessPool:
+                self._discard_executor(lane)
+                raise ValueError("Document parser crashed while reading the file")
+        finally:
+            lanes.put_nowait(lane)
+
+    def check_size(self, size: int) -> None:
+        if self.max_bytes and size > self.max_bytes:
+            raise ValueError(
+                f"Document is {size} bytes, larger than the parsing limit of {self.max_bytes} bytes"
+            )
+
+    @timed("parse")
+    async def parse_pdf(self, source: Source) -> str:
+        self.check_size(_source_size(source))
+        page_count = await self._run(_pdf_page_count, source)
+        if self.max_pages and page_count > self.max_pages:
+            raise ValueError(
+                f"Document has {page_count} pages, more than the parsing limit of {self.max_pages}"
+            )
+
+        # Spread the pages over the pool, but never in slices smaller than pages_per_job
+        per_job = max(self.pages_per_job, -(-page_count // self.workers))
+        jobs = [
+            self._run(_extract_pdf_pages, source, start, min(start + per_job, page_count))
+            for start in range(0, page_count, per_job)
+        ]
+        results = await asyncio.gather(*jobs)
+        return "\n\n".join(text for pages in results for text in pages)
+
+    @timed("parse")
+    async def parse_docx(self, source: Source) -> str:
+        self.check_size(_source_size(source))
+        return await self._run(_extract_docx, source)
+
+    @timed("parse")
+    async def parse_csv(self, source: Source) -> str:
+        self.check_size(_source_size(source))
+        return await self._run(_extract_csv, source)
+
+    def shutdown(self) -> None:
+        for lane, executor in enumerate(self._executors):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executors[lane] = None
+
+
+parsing_engine = ParsingEngine(
+    workers=settings.PARSER_WORKERS,
+    timeout=settings.PARSER_TIMEOUT_SECONDS,
+    max_pages=settings.PARSER_MAX_PAGES,
+    max_bytes=settings.PARSER_MAX_BYTES,
+    pages_per_job=settings.PARSER_PAGES_PER_JOB,
+)
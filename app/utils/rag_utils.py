@@ -1,71 +1,43 @@
-from langchain_google_genai import ChatGoogleGenerativeAI,GoogleGenerativeAIEmbeddings
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.messages import SystemMessage,HumanMessage,AIMessage
-from langchain_classic.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_core.messages import SystemMessage,HumanMessage
 from langchain_core.runnables import RunnableLambda
-from dotenv import load_dotenv
+from langchain_core.documents import Document
 from app.database import get_collection,get_gridfs_bucket
+from app.utils.embedding_cache import CachedEmbeddings
+from app.utils.text_cache import get_cached_text, store_text
+from app.utils.parsing import parsing_engine
+from app.utils.compression import original_length
+from app.utils.document_loader import DocumentSource, open_document_source, read_text_source
+from app.utils.llm_scheduler import llm_scheduler
+from app.utils.chat_context import build_history_messages
+from app.utils.library_index import index_chunks, remove_research, search_library
+from app.utils.web_search import run_web_search
+from app.utils.metrics import timed
+from app.utils.models import model_registry, get_text_splitter
+from app.utils.index_store import (
+    load_document_index, load_shared_document_index, save_document_index, delete_document_index, get_build_lock
+)
 from app.config import settings
 from bson import ObjectId
-from PyPDF2 import PdfReader
-from docx import Document as DocxDocument
-import csv
-import io
+import asyncio
 
 
-async def run_web_search(query: str, k: int = 4) -> str:
-    try:
-        tavily = TavilySearchResults(k=k)
-        results = tavily.run(query)
-
-        if not results:
-            return ""
-
-        formatted = "\n\n".join(
-            [
-                f"Title: {item.get('title')}\nURL: {item.get('url')}\nSnippet: {item.get('content')}"
-                for item in results
-            ]
-        )
+@timed("parse")
+async def parse_text_file(source: DocumentSource) -> str:
+    return await asyncio.to_thread(read_text_source, source)
 
-        return formatted
+async def parse_pdf(source: DocumentSource) -> str:
+    return await parsing_engine.parse_pdf(source)
 
-    except Exception as e:
-        return f"Web search error: {str(e)}"
+async def parse_docx(source: DocumentSource) -> str:
+    return await parsing_engine.parse_docx(source)
 
-async def parse_text_file(file_content: bytes) -> str:
-    return file_content.decode('utf-8', errors='ignore')
-
-async def parse_pdf(file_content: bytes) -> str:
-    try:
-        pdf_file = io.BytesIO(file_content)
-        reader = PdfReader(pdf_file)
-        text = "\n\n".join([page.extract_text() for page in reader.pages])
-        return text
-    except ImportError:
-        raise ImportError("PyPDF2 is required for PDF parsing. Install: pip install PyPDF2")
-
-async def parse_docx(file_content: bytes) -> str:
-    try:
-        docx_file = io.BytesIO(file_content)
-        doc = DocxDocument(docx_file)
-        text = "\n\n".join([paragraph.text for paragraph in doc.paragraphs])
-        return text
-    except ImportError:
-        raise ImportError("python-docx is required for DOCX parsing. Install: pip install python-docx")
-
-async def parse_csv(file_content: bytes) -> str:
-    text_content = file_content.decode('utf-8', errors='ignore')
-    csv_reader = csv.reader(io.StringIO(text_content))
-    rows = [", ".join(row) for row in csv_reader]
-    return "\n".join(rows)
+async def parse_csv(source: DocumentSource) -> str:
+    return await parsing_engine.parse_csv(source)
 
 async def get_document_content(document_id: str) -> str:
     research_collection = await get_collection(settings.RESEARCH_COLLECTION)
-    research_doc = await research_collection.find_one({"_id": ObjectId(document_id)})
+    async with timed("mongo_lookup"):
+        research_doc = await research_collection.find_one({"_id": ObjectId(document_id)})
     
     if not research_doc:
         raise ValueError(f"Research document with id {document_id} not found")
@@ -73,6 +45,11 @@ async def get_document_content(document_id: str) -> str:
     file_id = research_doc.get("file_id")
     if not file_id:
         raise ValueError(f"No file associated with research document {document_id}")
+
+    async with timed("text_cache"):
+        cached_text = await get_cached_text(file_id)
+    if cached_text is not None:
+        return cached_text
     
     bucket = await get_gridfs_bucket()
     
@@ -81,67 +58,168 @@ async def get_document_content(document_id: str) -> str:
     except Exception as e:
         raise ValueError(f"Failed to open file from GridFS: {e}")
 
-    file_content = b""
-    while True:
-        chunk = await grid_out.read(1024 * 1024) 
-        if not chunk:
-            break
-        file_content += chunk
+    parsing_engine.check_size(original_length(grid_out))
 
     extension = research_doc.get("extension", "").lower()
     research_name = research_doc.get("researchName", "Unknown")
 
-    try:
-        if extension in ["txt", "md", "py", "js", "json"]:
-            content_str = await parse_text_file(file_content)
-        elif extension == "pdf":
-            content_str = await parse_pdf(file_content)
-        elif extension in ["doc", "docx"]:
-            content_str = await parse_docx(file_content)
-        elif extension == "csv":
-            content_str = await parse_csv(file_content)
-        else:
-            try:
-                content_str = file_content.decode('utf-8', errors='ignore')
-            except:
-                raise ValueError(f"Unsupported file format: {extension}")
-    except Exception as e:
-        raise ValueError(f"Error parsing {extension} file: {e}")
-    
+    # Parser-pool formats are spooled so no job pickles a copy of the file
+    in_memory = extension not in ("pdf", "doc", "docx", "csv")
+    async with open_document_source(grid_out, in_memory=in_memory) as source:
+        try:
+            if extension in ["txt", "md", "py", "js", "json"]:
+                content_str = await parse_text_file(source)
+            elif extension == "pdf":
+                content_str = await parse_pdf(source)
+            elif extension in ["doc", "docx"]:
+                content_str = await parse_docx(source)
+            elif extension == "csv":
+                content_str = await parse_csv(source)
+            else:
+                try:
+                    content_str = await parse_text_file(source)
+                except:
+                    raise ValueError(f"Unsupported file format: {extension}")
+        except Exception as e:
+            raise ValueError(f"Error parsing {extension} file: {e}")
+
+    await store_text(file_id, content_str, research_doc.get("user_id"))
     return content_str
 
-async def get_vector_store_retriever(document_content:str):
-    splitter= RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
+def get_embedding(user_id=None):
+    return CachedEmbeddings(
+        model_registry.embeddings(settings.EMBEDDING_MODEL),
+        settings.EMBEDDING_MODEL,
+        user_id,
     )
-    chunks= splitter.create_documents([document_content])
-    embedding = GoogleGenerativeAIEmbeddings(model="models/gemini-embedding-001")
-    vector_store= FAISS.from_documents(
+
+@timed("split")
+def split_text(document_content:str):
+    splitter= get_text_splitter(1000, 200)
+    return splitter.split_text(document_content)
+
+@timed("faiss_build")
+async def build_vector_store(document_content:str, embedding=None, user_id=None):
+    from langchain_community.vectorstores import FAISS
+    chunks= [Document(page_content=chunk) for chunk in split_text(document_content)]
+    embedding = embedding or get_embedding(user_id)
+    vector_store= await FAISS.afrom_documents(
         documents=chunks,
         embedding=embedding
     )
-    retriever= vector_store.as_retriever(
+    return vector_store
+
+def as_retriever(vector_store):
+    return vector_store.as_retriever(
         search_type="similarity", 
         search_kwargs={"k": 4}
     )
-    return retriever
+
+async def get_vector_store_retriever(document_content:str, user_id=None):
+    vector_store= await build_vector_store(document_content, user_id=user_id)
+    return as_retriever(vector_store)
+
+async def is_current_file(document_id, file_id) -> bool:
+    """Whether the research document still exists and still points at file_id."""
+    research_collection = await get_collection(settings.RESEARCH_COLLECTION)
+    research_doc = await research_collection.find_one(
+        {"_id": ObjectId(document_id), "file_id": ObjectId(file_id)}, {"_id": 1}
+    )
+    return research_doc is not None
+
+async def get_document_retriever(document_id: str, user_id=None):
+    research_collection = await get_collection(settings.RESEARCH_COLLECTION)
+    research_doc = await research_collection.find_one({"_id": ObjectId(document_id)}, {"file_id": 1})
+    if not research_doc:
+        raise ValueError(f"Research document with id {document_id} not found")
+
+    file_id = research_doc.get("file_id")
+    if not file_id:
+        raise ValueError(f"No file associated with research document {document_id}")
+
+    embedding = get_embedding(user_id)
+    vector_store = await load_document_index(document_id, file_id, embedding)
+    if vector_store is None:
+        async with get_build_lock(document_id, file_id):
+            vector_store = await load_document_index(document_id, file_id, embedding)
+            if vector_store is None:
+                vector_store = await load_shared_document_index(file_id, embedding)
+                if vector_store is None:
+                    document_content = await get_document_content(document_id)
+                    vector_store = await build_vector_store(document_content, embedding)
+                # A delete or re-upload meanwhile has already cleared this
+                # document's indexes; saving now would leave an orphan.
+                if await is_current_file(document_id, file_id):
+                    await save_document_index(document_id, file_id, vector_store)
+                    if not await is_current_file(document_id, file_id):
+                        await delete_document_index(document_id, file_id)
+    return as_retriever(vector_store)
+
+async def index_research_library(document_id: str, file_id=None):
+    research_collection = await get_collection(settings.RESEARCH_COLLECTION)
+    research_doc = await research_collection.find_one({"_id": ObjectId(document_id)})
+    if not research_doc or not research_doc.get("file_id"):
+        return 0
+    file_id = ObjectId(file_id or research_doc["file_id"])
+    if research_doc["file_id"] != file_id:
+        return 0
+
+    user_id = str(research_doc["user_id"])
+    document_content = await get_document_content(document_id)
+    indexed = await index_chunks(
+        user_id,
+        research_doc["_id"],
+        file_id,
+        research_doc.get("researchName", "Unknown"),
+        split_text(document_content),
+        get_embedding(user_id),
+        still_current=lambda: is_current_file(document_id, file_id),
+    )
+    # Deleted or re-uploaded while writing: take back this file's chunks
+    if indexed and not await is_current_file(document_id, file_id):
+        await remove_research(user_id, document_id, file_id)
+        return 0
+    return indexed
+
+async def get_library_context(question: str, user_id: str):
+    docs = await search_library(user_id, question, get_embedding(user_id), settings.LIBRARY_TOP_K)
+    return "\n\n".join(
+        f"[{doc.metadata.get('researchName')}]\n{doc.page_content}" for doc in docs
+    )
 
 def format_docs(retrieved_docs):
     return "\n\n".join(doc.page_content for doc in retrieved_docs)
 
-async def generateResponse(question,chat_id=None,document_id=None,web_search=False):
-    load_dotenv()
-    context_text = None
-    if(document_id):
-        document_content= await get_document_content(document_id)
-        retriever= await get_vector_store_retriever(document_content)
+@timed("retrieval")
+async def get_context_text(question,document_id=None,user_id=None,scope=None):
+    if scope == "library":
+        return await get_library_context(question, user_id)
+    if document_id:
+        retriever= await get_document_retriever(document_id, user_id)
         context_chain= retriever | RunnableLambda(format_docs)
-        context_text= await context_chain.ainvoke(question)
+        return await context_chain.ainvoke(question)
+    return None
+
+async def get_optional_context(source, awaitable, timeout):
+    # A slow or failing context source is dropped so the answer can still go out with the rest.
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"⚠️ {source} timed out after {timeout}s; answering without it")
+    except Exception as e:
+        print(f"⚠️ {source} failed: {e}; answering without it")
+    return None
 
-    web_context = ""
-    if web_search:
-        web_context = await run_web_search(question)
+async def build_chat_messages(question,chat_id=None,document_id=None,web_search=False,user_id=None,scope=None):
+    context_text, web_context, history = await asyncio.gather(
+        get_optional_context(
+            "Document retrieval",
+            get_context_text(question, document_id, user_id, scope),
+            settings.CONTEXT_RETRIEVAL_TIMEOUT_SECONDS,
+        ),
+        run_web_search(question) if web_search else asyncio.sleep(0, result=""),
+        build_history_messages(chat_id, user_id),
+    )
 
     if context_text:
         system_prompt = f"""
@@ -168,23 +246,29 @@ async def generateResponse(question,chat_id=None,document_id=None,web_search=Fal
         {web_context}
         """
 
-    chatHistoryModel= await get_collection(settings.CHATHISTORY_COLLECTION)
-    chat= await chatHistoryModel.find_one({"_id":ObjectId(chat_id)})
     chat_messages=[SystemMessage(content=system_prompt)]
-    if(chat):
-        chat_history= chat.get('messages',[])
-        for message in chat_history:
-            chat_messages.append(HumanMessage(content= message['question']))
-            chat_messages.append(AIMessage(content= message['response']))
+    chat_messages.extend(history)
     
     chat_messages.append(HumanMessage(content=question))
+    return chat_messages
+
+ANSWER_MODEL = 'gemini-2.5-flash-lite'
 
-    response=""
-    llm= ChatGoogleGenerativeAI(model='gemini-2.5-flash-lite')
-    parser= StrOutputParser()
-    final_chain= llm | parser
-    response= final_chain.invoke(chat_messages)
+def get_answer_chain():
+    return model_registry.chain("answer", ANSWER_MODEL)
+
+async def generateResponse(question,chat_id=None,document_id=None,web_search=False,user_id=None,scope=None):
+    chat_messages= await build_chat_messages(question,chat_id,document_id,web_search,user_id,scope)
+    final_chain= get_answer_chain()
+    async with timed("llm"):
+        response= await llm_scheduler.run(user_id, lambda: final_chain.ainvoke(chat_messages))
         
     return response
-    
 
+async def streamResponse(question,chat_id=None,document_id=None,web_search=False,user_id=None,scope=None):
+    chat_messages= await build_chat_messages(question,chat_id,document_id,web_search,user_id,scope)
+    final_chain= get_answer_chain()
+    async with timed("llm_stream"):
+        async for token in llm_scheduler.stream(user_id, lambda: final_chain.astream(chat_messages)):
+            if token:
+                yield token
@@ -0,0 +1,74 @@
+from app.database import get_collection
+from app.config import settings
+from typing import List
+import re
+
+# Two ways to search a user's research library:
+#
+# - prefix (the default) matches the start of any word of researchName or
+#   fileName, so "prot" finds "protein" and "v2" finds "paper_v2.pdf". It runs
+#   on nameTokens, the lowercased words of both names, through the
+#   (user_id, nameTokens) index: an anchored, escaped regex is an index range.
+# - text ranks by relevance through the (user_id, researchName, fileName) text
+#   index on research and, for document bodies, the (user_id, searchText) text
+#   index on the extracted-text cache. Text indexes need the user_id equality
+#   prefix, which every query here has.
+
+BODY_SCORE_WEIGHT = 1.0
+MAX_PREFIX_TERMS = 8
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def name_tokens(*names: str) -> List[str]:
+    """The distinct lowercased words of the given names, for prefix search."""
+    tokens = []
+    for name in names:
+        for token in _WORD.findall((name or "").lower()):
+            if token not in tokens:
+                tokens.append(token)
+    return tokens
+
+
+def prefix_filter(search: str) -> dict:
+    """Match documents where every word of the search starts some word of their names."""
+    terms = name_tokens(search)[:MAX_PREFIX_TERMS]
+    if not terms:
+        return {"nameTokens": {"$in": []}}
+    return {"$and": [{"nameTokens": {"$regex": f"^{re.escape(term)}"}} for term in terms]}
+
+
+async def search_research(query: dict, search: str, limit: int, offset: int = 0, search_body: bool = False) -> List[dict]:
+    research_collection = await get_collection(settings.RESEARCH_COLLECTION)
+    window = offset + limit
+    score = {"score": {"$meta": "textScore"}}
+
+    scores: dict = {}
+    docs: dict = {}
+    name_cursor = (
+        research_collection
+        .find({**query, "$text": {"$search": search}}, score)
+        .sort([("score", {"$meta": "textScore"})])
+        .limit(window)
+    )
+    async for doc in name_cursor:
+        docs[doc["_id"]] = doc
+        scores[doc["_id"]] = doc.pop("score", 0.0)
+
+    if search_body:
+        text_collection = await get_collection(settings.DOCUMENT_TEXT_COLLECTION)
+        body_cursor = (
+            text_collection
+            .find({"user_id": query["user_id"], "$text": {"$search": search}}, {"file_id": 1, **score})
+            .sort([("score", {"$meta": "textScore"})])
+            .limit(window)
+        )
+        body_scores = {doc.get("file_id", doc["_id"]): doc["score"] async for doc in body_cursor}
+        if body_scores:
+            body_cursor = research_collection.find({**query, "file_id": {"$in": list(body_scores)}})
+            async for doc in body_cursor:
+                docs.setdefault(doc["_id"], doc)
+                scores[doc["_id"]] = scores.get(doc["_id"], 0.0) + BODY_SCORE_WEIGHT * body_scores[doc["file_id"]]
+
+    ranked = sorted(docs, key=lambda doc_id: (scores[doc_id], doc_id), reverse=True)
+    return [docs[doc_id] for doc_id in ranked[offset:window]]
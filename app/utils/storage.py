@@ -0,0 +1,137 @@
+from fastapi import UploadFile
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from gridfs.errors import NoFile
+from bson import ObjectId
+from app.database import get_collection, get_gridfs_bucket
+from app.config import settings
+from app.utils.compression import Compressor, choose_codec
+from datetime import datetime, timezone
+from typing import Optional
+import hashlib
+
+# Uploaded files are stored content-addressed: fileBlobs maps the SHA-256 of
+# the bytes (its _id) to one GridFS file and counts the research documents that
+# reference it. Identical uploads share the blob, and with it every cache keyed
+# by file_id (extracted text, summaries, document indexes).
+
+_READ_SIZE = 1024 * 1024
+_MAX_ATTEMPTS = 3
+
+
+async def hash_upload(file: UploadFile) -> tuple[str, int, bytes]:
+    # Starlette has already spooled the upload, so this pass reads local data only.
+    digest = hashlib.sha256()
+    length = 0
+    head = b""
+    await file.seek(0)
+    while True:
+        chunk = await file.read(_READ_SIZE)
+        if not chunk:
+            break
+        if not head:
+            head = chunk
+        digest.update(chunk)
+        length += len(chunk)
+    await file.seek(0)
+    return digest.hexdigest(), length, head
+
+
+async def _add_reference(digest: str):
+    blobs = await get_collection(settings.FILE_BLOBS_COLLECTION)
+    return await blobs.find_one_and_update(
+        {"_id": digest, "refCount": {"$gt": 0}},
+        {"$inc": {"refCount": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _upload(file: UploadFile, filename: str, metadata: dict, codec: Optional[str]) -> ObjectId:
+    bucket = await get_gridfs_bucket()
+    grid_in = bucket.open_upload_stream(filename, metadata=metadata)
+    compressor = Compressor(codec) if codec else None
+    try:
+        while True:
+            chunk = await file.read(_READ_SIZE)
+            if not chunk:
+                break
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                await grid_in.write(chunk)
+        if compressor is not None:
+            await grid_in.write(compressor.flush())
+    finally:
+        await grid_in.close()
+    return grid_in._id
+
+
+async def store_upload(file: UploadFile, extension: str) -> tuple[ObjectId, bool]:
+    """Store an upload, or reference an identical stored file.
+
+    The GridFS file is named after the digest and carries no per-upload
+    details: names and content types belong to the research documents that
+    reference it. Returns the GridFS file id and whether the bytes were
+    already stored.
+    """
+    digest, length, head = await hash_upload(file)
+    blobs = await get_collection(settings.FILE_BLOBS_COLLECTION)
+    codec = choose_codec(extension, head)
+    metadata = {"sha256": digest}
+    if codec:
+        metadata.update({"compression": codec, "originalLength": length})
+
+    for _ in range(_MAX_ATTEMPTS):
+        blob = await _add_reference(digest)
+        if blob is not None:
+            return blob["file_id"], True
+
+        file_id = await _upload(file, digest, metadata, codec)
+        try:
+            await blobs.insert_one({
+                "_id": digest,
+                "file_id": file_id,
+                "length": length,
+                "refCount": 1,
+                "createdAt": datetime.now(timezone.utc),
+            })
+            return file_id, False
+        except DuplicateKeyError:
+            # Someone stored the same bytes meanwhile; drop our copy and share theirs.
+            await _delete_grid_file(file_id)
+            await file.seek(0)
+        except Exception:
+            await _delete_grid_file(file_id)
+            raise
+
+    raise RuntimeError(f"Could not store upload {file.filename}: blob {digest} kept changing")
+
+
+async def _delete_grid_file(file_id) -> None:
+    bucket = await get_gridfs_bucket()
+    try:
+        await bucket.delete(ObjectId(file_id))
+    except NoFile:
+        pass
+
+
+async def release_file(file_id) -> bool:
+    """Drop one reference to a stored file; returns True if the file was deleted."""
+    blobs = await get_collection(settings.FILE_BLOBS_COLLECTION)
+    blob = await blobs.find_one_and_update(
+        {"file_id": ObjectId(file_id)},
+        {"$inc": {"refCount": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if blob is None:
+        # Stored before deduplication existed: the file has a single owner.
+        await _delete_grid_file(file_id)
+        return True
+    if blob["refCount"] > 0:
+        return False
+
+    result = await blobs.delete_one({"_id": blob["_id"], "refCount": {"$lte": 0}})
+    if not result.deleted_count:
+        return False
+    await _delete_grid_file(file_id)
+    return True
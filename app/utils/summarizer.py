@@ -1,15 +1,20 @@
 from .rag_utils import get_document_content,get_vector_store_retriever,format_docs
-from youtube_transcript_api import YouTubeTranscriptApi
-from langchain_google_genai import ChatGoogleGenerativeAI
+from .llm_scheduler import llm_scheduler
+from .chat_context import count_tokens
+from .summary_cache import cached_summary, content_hash
+from .singleflight import SingleFlight
+from .metrics import timed
+from app.database import get_collection
+from app.config import settings
+from .models import model_registry, get_text_splitter
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnableLambda
-from dotenv import load_dotenv
-from typing import List
+from bson import ObjectId
+from datetime import datetime, timezone
+from typing import List, Optional
+import asyncio
 import re
 
-load_dotenv()
-
 def extract_video_id(url):
     patterns = [
         r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/|youtube\.com\/v\/)([a-zA-Z0-9_-]{11})',
@@ -26,65 +31,212 @@ def extract_video_id(url):
     
     raise ValueError("Invalid YouTube URL or Video ID")
 
-async def SummarizeResearch(documents:List[str]):
+RESEARCH_SUMMARY_MODEL = 'gemini-2.5-flash-lite'
+TEXT_SUMMARY_MODEL = 'gemini-2.5-flash'
+VIDEO_SUMMARY_MODEL = 'gemini-2.5-flash'
+
+MAP_PROMPT= PromptTemplate(
+    template="""
+    You are a helpful AI Assistant. Summarize this part of the research document "{name}".
+    Keep the key findings, methods, numbers and conclusions.
+
+    {content}
+    """,
+    input_variables=['name', 'content']
+)
+
+REDUCE_PROMPT= PromptTemplate(
+    template="""
+    You are a helpful AI Assistant. The following are summaries of sections of one or more
+    research documents. Combine them into a single summary that covers all the aspects.
+
+    {content}
+    """,
+    input_variables=['content']
+)
+
+TEXT_SUMMARY_PROMPT= PromptTemplate(
+    template="""
+    You are a helpful AI Assistant summarize this {content}
+    """,
+    input_variables=['content']
+)
+
+VIDEO_SUMMARY_PROMPT= PromptTemplate(
+    template="""
+    You are a helpful AI Assistant summarize this {content} of video. The content can 
+    be irrelevant to each other becaus emay it's different documents but you have to cover 
+    all the aspects.
+    """,
+    input_variables=['content']
+)
+
+def get_summary_chain(name, prompt, model=RESEARCH_SUMMARY_MODEL):
+    return model_registry.chain(name, model, prompt)
+
+def summary_key(file_id) -> str:
+    return f"{file_id}:{RESEARCH_SUMMARY_MODEL}"
+
+async def invalidate_document_summaries(file_id):
+    collection= await get_collection(settings.DOCUMENT_SUMMARY_COLLECTION)
+    await collection.delete_many({"file_id": ObjectId(file_id)})
+
+@timed("summarize_map")
+async def summarize_document_chunks(document_id:str, semaphore:asyncio.Semaphore, user_id:Optional[str]=None):
+    # Map step for one document; the per-chunk summaries are cached per file version and model.
+    research_collection= await get_collection(settings.RESEARCH_COLLECTION)
+    research_doc= await research_collection.find_one({"_id": ObjectId(document_id)}, {"file_id": 1, "researchName": 1})
+    if not research_doc or not research_doc.get("file_id"):
+        raise ValueError(f"Research document with id {document_id} not found")
+    name= research_doc.get("researchName", "Unknown")
+
+    collection= await get_collection(settings.DOCUMENT_SUMMARY_COLLECTION)
+    key= summary_key(research_doc["file_id"])
+    cached= await collection.find_one({"_id": key}, {"summaries": 1})
+    if cached:
+        return name, cached["summaries"]
+
+    document_content= await get_document_content(document_id)
+    splitter= get_text_splitter(settings.SUMMARY_CHUNK_SIZE, settings.SUMMARY_CHUNK_OVERLAP)
+    map_chain= get_summary_chain("summary-map", MAP_PROMPT)
+
+    async def summarize_chunk(chunk):
+        async with semaphore:
+            return await llm_scheduler.run(user_id, lambda: map_chain.ainvoke({"name": name, "content": chunk}))
+
+    summaries= list(await asyncio.gather(*[summarize_chunk(chunk) for chunk in splitter.split_text(document_content)]))
+    await collection.replace_one(
+        {"_id": key},
+        {
+            "file_id": research_doc["file_id"],
+            "model": RESEARCH_SUMMARY_MODEL,
+            "summaries": summaries,
+            "createdAt": datetime.now(timezone.utc),
+        },
+        upsert=True,
+    )
+    return name, summaries
+
+def format_sections(results):
+    return "\n\n".join(
+        f"DOCUMENT: {name}\n" + "\n\n".join(summaries)
+        for name, summaries in results
+    )
+
+async def get_file_ids(documents:List[str]):
+    research_collection= await get_collection(settings.RESEARCH_COLLECTION)
+    cursor= research_collection.find({"_id": {"$in": [ObjectId(document) for document in documents]}}, {"file_id": 1})
+    file_ids= {str(doc["_id"]): doc.get("file_id") async for doc in cursor}
+    for document in documents:
+        if not file_ids.get(document):
+            raise ValueError(f"Research document with id {document} not found")
+    return sorted({str(file_id) for file_id in file_ids.values()})
+
+async def map_reduce_research(documents:List[str], user_id:Optional[str]=None):
+    semaphore= asyncio.Semaphore(settings.SUMMARY_MAP_CONCURRENCY)
+    results= await asyncio.gather(*[
+        summarize_document_chunks(document, semaphore, user_id) for document in documents
+    ])
+
+    reduce_chain= get_summary_chain("summary-reduce", REDUCE_PROMPT)
+    sections= format_sections(results)
+    if count_tokens(sections) > settings.SUMMARY_REDUCE_TOKEN_LIMIT:
+        # Too much for one reduce call: collapse each document to a single summary first
+        async def collapse(name, summaries):
+            if len(summaries) <= 1:
+                return name, summaries
+            summary= await llm_scheduler.run(user_id, lambda: reduce_chain.ainvoke("\n\n".join(summaries)))
+            return name, [summary]
+        results= await asyncio.gather(*[collapse(name, summaries) for name, summaries in results])
+        sections= format_sections(results)
+
+    result= await llm_scheduler.run(user_id, lambda: reduce_chain.ainvoke(sections))
+    return result
+
+@timed("summarize_research")
+async def SummarizeResearch(documents:List[str], user_id:Optional[str]=None):
     try:
-        content_to_summarize=""
-        for document in documents:
-            document_content= await get_document_content(document)
-            content_to_summarize+=document_content
-
-        prompt= PromptTemplate(
-        template="""
-        You are a helpful AI Assistant summarize this {content}
-        """,
-        input_variables=['content']
+        file_ids= await get_file_ids(documents)
+        return await cached_summary(
+            "summarize-research",
+            RESEARCH_SUMMARY_MODEL,
+            ",".join(file_ids),
+            lambda: map_reduce_research(documents, user_id),
+            file_ids=file_ids,
         )
-        llm= ChatGoogleGenerativeAI(model='gemini-2.5-flash-lite')
-        parser= StrOutputParser()
-        summarize_chain= prompt | llm | parser
-
-        result= await summarize_chain.ainvoke(content_to_summarize)
-        return result
     except Exception as e:
         return str(e)
     
-async def SummarizeTextResearch(content:str):
+async def summarize_text(content:str, user_id:Optional[str]=None):
+    summarize_chain= get_summary_chain("summary-text", TEXT_SUMMARY_PROMPT, TEXT_SUMMARY_MODEL)
+
+    result= await llm_scheduler.run(user_id, lambda: summarize_chain.ainvoke(content))
+    return result
+
+@timed("summarize_text")
+async def SummarizeTextResearch(content:str, user_id:Optional[str]=None):
     try:
-        prompt= PromptTemplate(
-        template="""
-        You are a helpful AI Assistant summarize this {content}
-        """,
-        input_variables=['content']
+        return await cached_summary(
+            "summarize-research-text",
+            TEXT_SUMMARY_MODEL,
+            content_hash(content),
+            lambda: summarize_text(content, user_id),
         )
-        llm= ChatGoogleGenerativeAI(model='gemini-2.5-flash')
-        parser= StrOutputParser()
-        summarize_chain= prompt | llm | parser
-
-        result= await summarize_chain.ainvoke(content)
-        return result
     except Exception as e:
         return str(e)
 
-async def SummarizeVideo(video_url:str):
+_video_flights= SingleFlight()
+
+def fetch_transcript_sync(video_id:str):
+    from youtube_transcript_api import YouTubeTranscriptApi
+    transcript_list = YouTubeTranscriptApi().fetch(video_id)
+    return " ".join([item.text for item in transcript_list.snippets])
+
+@timed("transcript_fetch")
+async def get_transcript(video_id:str):
+    collection= await get_collection(settings.VIDEO_TRANSCRIPTS_COLLECTION)
+    cached= await collection.find_one({"_id": video_id}, {"transcript": 1})
+    if cached:
+        return cached["transcript"]
+
     try:
-        question= 'Summarize this Content of video'
-        video_id = extract_video_id(video_url)
-        transcript_list = YouTubeTranscriptApi().fetch(video_id)
-        transcript = " ".join([item.text for item in transcript_list.snippets])
-        retriever= await get_vector_store_retriever(transcript)
-        prompt= PromptTemplate(
-            template="""
-            You are a helpful AI Assistant summarize this {content} of video. The content can 
-            be irrelevant to each other becaus emay it's different documents but you have to cover 
-            all the aspects.
-            """,
-            input_variables=['content']
+        # The transcript API is blocking; a timed-out fetch is abandoned, not killed.
+        transcript= await asyncio.wait_for(
+            asyncio.to_thread(fetch_transcript_sync, video_id),
+            timeout=settings.TRANSCRIPT_FETCH_TIMEOUT_SECONDS,
         )
-        llm= ChatGoogleGenerativeAI(model='gemini-2.5-flash')
-        parser= StrOutputParser()
-        video_summarize_chain= retriever | RunnableLambda(format_docs) | prompt | llm | parser
-        result= await video_summarize_chain.ainvoke(question)
-        return result
+    except asyncio.TimeoutError:
+        raise ValueError(f"Fetching the transcript for video {video_id} timed out")
+
+    await collection.update_one(
+        {"_id": video_id},
+        {"$set": {"transcript": transcript, "createdAt": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    return transcript
+
+async def summarize_video(video_id:str, user_id:Optional[str]=None):
+    # Only the transcript is kept in videoTranscripts; the summary is cached
+    # (with its TTL) by cached_summary in SummarizeVideo.
+    question= 'Summarize this Content of video'
+    transcript= await get_transcript(video_id)
+    # Chunk embeddings come from the embedding cache, so a known transcript costs no embedding calls
+    retriever= await get_vector_store_retriever(transcript, user_id)
+    context_chain= retriever | RunnableLambda(format_docs)
+    context= await context_chain.ainvoke(question)
+    video_summarize_chain= get_summary_chain("summary-video", VIDEO_SUMMARY_PROMPT, VIDEO_SUMMARY_MODEL)
+    result= await llm_scheduler.run(user_id, lambda: video_summarize_chain.ainvoke(context))
+    return result
 
+@timed("summarize_video")
+async def SummarizeVideo(video_url:str, user_id:Optional[str]=None):
+    try:
+        video_id = extract_video_id(video_url)
+        return await cached_summary(
+            "summarize-video",
+            VIDEO_SUMMARY_MODEL,
+            video_id,
+            lambda: _video_flights.do(video_id, lambda: summarize_video(video_id, user_id)),
+        )
     except Exception as e:
-        return str(e)
\ No newline at end of file
+        return str(e)
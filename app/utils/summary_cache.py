@@ -0,0 +1,90 @@
+from app.database import get_collection
+from app.config import settings
+from app.utils.lru import ByteLRUCache
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List, Optional
+import hashlib
+import json
+
+# Results of the summarize endpoints, keyed by (endpoint, model, source hash).
+# Mongo holds the shared copy (expired by a TTL index, trimmed to
+# SUMMARY_CACHE_MAX_ENTRIES); an in-process LRU answers repeats without a round trip.
+
+_memory_cache = ByteLRUCache(settings.SUMMARY_CACHE_MEMORY_BYTES)
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def summary_cache_key(endpoint: str, model: str, source: str) -> str:
+    return hashlib.sha256(json.dumps([endpoint, model, source]).encode("utf-8")).hexdigest()
+
+
+async def cached_summary(
+    endpoint: str,
+    model: str,
+    source: str,
+    compute: Callable[[], Awaitable[str]],
+    file_ids: Optional[List] = None,
+) -> str:
+    key = summary_cache_key(endpoint, model, source)
+    now = datetime.now(timezone.utc)
+
+    entry = _memory_cache.get(key)
+    if entry is not None and entry["expiresAt"] > now:
+        return entry["result"]
+
+    collection = await get_collection(settings.SUMMARY_CACHE_COLLECTION)
+    doc = await collection.find_one({"_id": key}, {"result": 1, "expiresAt": 1, "file_ids": 1})
+    if doc:
+        expires_at = doc["expiresAt"].replace(tzinfo=timezone.utc)
+        if expires_at > now:
+            _remember(key, doc["result"], expires_at, doc.get("file_ids", []))
+            return doc["result"]
+
+    result = await compute()
+
+    expires_at = now + timedelta(seconds=settings.SUMMARY_CACHE_TTL_SECONDS)
+    file_ids = [ObjectId(file_id) for file_id in (file_ids or [])]
+    await collection.replace_one(
+        {"_id": key},
+        {
+            "endpoint": endpoint,
+            "model": model,
+            "result": result,
+            "file_ids": file_ids,
+            "createdAt": now,
+            "expiresAt": expires_at,
+        },
+        upsert=True,
+    )
+    _remember(key, result, expires_at, file_ids)
+    await _trim(collection)
+    return result
+
+
+def _remember(key: str, result: str, expires_at: datetime, file_ids: List) -> None:
+    entry = {"result": result, "expiresAt": expires_at, "file_ids": {str(file_id) for file_id in file_ids}}
+    _memory_cache.put(key, entry, len(result.encode("utf-8")))
+
+
+async def _trim(collection) -> None:
+    overflow = await collection.estimated_document_count() - settings.SUMMARY_CACHE_MAX_ENTRIES
+    if overflow <= 0:
+        return
+    cursor = collection.find({}, {"_id": 1}).sort("createdAt", 1).limit(overflow)
+    oldest = [doc["_id"] async for doc in cursor]
+    await collection.delete_many({"_id": {"$in": oldest}})
+    for key in oldest:
+        _memory_cache.pop(key)
+
+
+async def invalidate_summary_cache(file_id) -> None:
+    collection = await get_collection(settings.SUMMARY_CACHE_COLLECTION)
+    await collection.delete_many({"file_ids": ObjectId(file_id)})
+    file_id = str(file_id)
+    for key, entry in _memory_cache.items():
+        if file_id in entry["file_ids"]:
+            _memory_cache.pop(key)
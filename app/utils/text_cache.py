@@ -0,0 +1,73 @@
+from bson import Binary, ObjectId
+from bson.errors import InvalidDocument
+from pymongo.errors import PyMongoError
+from app.database import get_collection
+from app.config import settings
+from datetime import datetime, timezone
+from typing import Optional
+import zlib
+
+# Stay clear of Mongo's 16 MB document limit; larger texts are simply not cached.
+_MAX_DOCUMENT_BYTES = 15 * 1024 * 1024
+
+
+async def get_cached_text(file_id) -> Optional[str]:
+    collection = await get_collection(settings.DOCUMENT_TEXT_COLLECTION)
+    doc = await collection.find_one({"_id": ObjectId(file_id)}, {"text": 1})
+    if not doc:
+        return None
+    return zlib.decompress(doc["text"]).decode("utf-8")
+
+
+async def store_text(file_id, text: str, user_id=None) -> None:
+    """Cache extracted text. Best effort: a text that cannot be stored stays a cache miss."""
+    collection = await get_collection(settings.DOCUMENT_TEXT_COLLECTION)
+    encoded = text.encode("utf-8")
+    compressed = zlib.compress(encoded, 6)
+    doc = {
+        "file_id": ObjectId(file_id),
+        "text": Binary(compressed),
+        "length": len(encoded),
+        "createdAt": datetime.now(timezone.utc),
+    }
+    size = len(compressed)
+    if user_id is not None:
+        # Uncompressed, truncated copy that backs the per-user body text index
+        doc["user_id"] = ObjectId(user_id)
+        doc["searchText"] = text[:settings.SEARCH_BODY_MAX_CHARS]
+        size += len(doc["searchText"].encode("utf-8"))
+    if size > _MAX_DOCUMENT_BYTES:
+        print(f"⚠️ Not caching text of {file_id}: {size} bytes is too large for one document")
+        return
+    try:
+        await collection.replace_one({"_id": ObjectId(file_id)}, doc, upsert=True)
+    except (PyMongoError, InvalidDocument) as e:
+        print(f"⚠️ Failed to cache text of {file_id}: {e}")
+
+
+async def share_text(file_id, user_id) -> None:
+    """Make a deduplicated file's cached text searchable by another owner.
+
+    The body text index is prefixed by a single user_id, so each additional
+    owner gets a search-only copy keyed "<file_id>:<user_id>".
+    """
+    collection = await get_collection(settings.DOCUMENT_TEXT_COLLECTION)
+    doc = await collection.find_one({"_id": ObjectId(file_id)}, {"user_id": 1, "searchText": 1})
+    if not doc or doc.get("user_id") in (None, ObjectId(user_id)):
+        return
+    await collection.update_one(
+        {"_id": f"{file_id}:{user_id}"},
+        {"$setOnInsert": {
+            "file_id": ObjectId(file_id),
+            "user_id": ObjectId(user_id),
+            "searchText": doc.get("searchText", ""),
+            "createdAt": datetime.now(timezone.utc),
+        }},
+        upsert=True,
+    )
+
+
+async def invalidate_text(file_id) -> None:
+    collection = await get_collection(settings.DOCUMENT_TEXT_COLLECTION)
+    await collection.delete_one({"_id": ObjectId(file_id)})
+    await collection.delete_many({"file_id": ObjectId(file_id)})
@@ -0,0 +1,83 @@
+from app.config import settings
+from app.utils.lru import ByteLRUCache
+from app.utils.singleflight import SingleFlight
+from app.utils.metrics import timed
+from typing import List
+import asyncio
+import time
+
+# Web search results are cached in-process by normalized query for
+# WEB_SEARCH_CACHE_TTL_SECONDS. WEB_SEARCH_PROVIDER=stub returns canned results
+# without touching the network, for local development and offline testing.
+
+_search_cache = ByteLRUCache(settings.WEB_SEARCH_CACHE_BYTES)
+_search_flights = SingleFlight()
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def _tavily_search(query: str, k: int) -> List[dict]:
+    from langchain_community.tools.tavily_search import TavilySearchResults
+    tavily = TavilySearchResults(k=k)
+    return tavily.run(query) or []
+
+
+def _stub_search(query: str, k: int) -> List[dict]:
+    return [
+        {
+            "title": f"Stub result {i + 1} for {query}",
+            "url": f"https://example.com/search/{i + 1}",
+            "content": f"Offline placeholder snippet {i + 1} about {query}.",
+        }
+        for i in range(k)
+    ]
+
+
+_PROVIDERS = {
+    "tavily": _tavily_search,
+    "stub": _stub_search,
+}
+
+
+def format_results(results: List[dict]) -> str:
+    return "\n\n".join(
+        [
+            f"Title: {item.get('title')}\nURL: {item.get('url')}\nSnippet: {item.get('content')}"
+            for item in results
+        ]
+    )
+
+
+async def _search(query: str, k: int) -> str:
+    provider = _PROVIDERS.get(settings.WEB_SEARCH_PROVIDER)
+    if provider is None:
+        raise ValueError(f"Unknown web search provider: {settings.WEB_SEARCH_PROVIDER}")
+    # Providers are blocking HTTP clients, so they run in a worker thread.
+    results = await asyncio.wait_for(
+        asyncio.to_thread(provider, query, k),
+        timeout=settings.WEB_SEARCH_TIMEOUT_SECONDS,
+    )
+    return format_results(results) if results else ""
+
+
+@timed("web_search")
+async def run_web_search(query: str, k: int = 4) -> str:
+    key = (settings.WEB_SEARCH_PROVIDER, normalize_query(query), k)
+    cached = _search_cache.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    try:
+        formatted = await _search_flights.do(key, lambda: _search(key[1], k))
+    except asyncio.TimeoutError:
+        print(f"⚠️ Web search timed out for query: {query}")
+        return ""
+    except Exception as e:
+        print(f"⚠️ Web search failed: {e}")
+        return ""
+
+    expires_at = time.monotonic() + settings.WEB_SEARCH_CACHE_TTL_SECONDS
+    _search_cache.put(key, (expires_at, formatted), len(formatted.encode("utf-8")) + 64)
+    return formatted
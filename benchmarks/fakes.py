@@ -0,0 +1,212 @@
+"""Local stand-ins for Mongo, GridFS and the Gemini models.
+
+Everything here exists so the benchmarks run offline and deterministically;
+nothing in this module is imported by the application.
+"""
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from datetime import datetime, timezone
+from typing import Optional
+from bson import ObjectId
+from gridfs.errors import NoFile
+import asyncio
+import itertools
+import sys
+
+EMBEDDING_SIZE = 768
+FAKE_ANSWER = (
+    "Based on the provided context, the experiment shows a consistent effect across all "
+    "measured conditions, and the results agree with the earlier findings in the library."
+)
+
+_CHUNK_SIZE = 255 * 1024
+
+
+class FakeChatModel(GenericFakeChatModel):
+    """GenericFakeChatModel with a fixed per-call latency to stand in for the network."""
+
+    latency: float = 0.0
+
+    async def _agenerate(self, *args, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._generate(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for chunk in self._stream(*args, **kwargs):
+            yield chunk
+
+
+def make_chat_model(latency: float):
+    def factory(model: Optional[str] = None, **kwargs):
+        return FakeChatModel(messages=itertools.repeat(AIMessage(content=FAKE_ANSWER)), latency=latency)
+    return factory
+
+
+def make_embeddings(model: Optional[str] = None, **kwargs):
+    return DeterministicFakeEmbedding(size=EMBEDDING_SIZE)
+
+
+# --- GridFS -----------------------------------------------------------------
+
+_files: dict = {}
+
+
+class FakeGridOut:
+    def __init__(self, stored: dict):
+        self._id = stored["_id"]
+        self.filename = stored["filename"]
+        self.metadata = stored["metadata"]
+        self.upload_date = stored["uploadDate"]
+        self.md5 = None
+        self._data = stored["data"]
+        self.length = len(self._data)
+        self._position = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.length - self._position
+        data = self._data[self._position:self._position + size]
+        self._position += len(data)
+        return data
+
+    async def readchunk(self) -> bytes:
+        return await self.read(_CHUNK_SIZE - self._position % _CHUNK_SIZE)
+
+    def seek(self, position: int, whence: int = 0) -> None:
+        self._position = position
+
+    def tell(self) -> int:
+        return self._position
+
+
+class FakeGridIn:
+    def __init__(self, bucket: str, filename: str, metadata: Optional[dict], file_id=None):
+        self._id = file_id or ObjectId()
+        self._bucket = bucket
+        self._filename = filename
+        self._metadata = metadata
+        self._parts = []
+
+    async def write(self, data: bytes) -> None:
+        self._parts.append(bytes(data))
+
+    async def close(self) -> None:
+        _files[(self._bucket, self._id)] = {
+            "_id": self._id,
+            "filename": self._filename,
+            "metadata": self._metadata,
+            "data": b"".join(self._parts),
+            "uploadDate": datetime.now(timezone.utc).replace(tzinfo=None),
+        }
+
+    async def abort(self) -> None:
+        self._parts = []
+
+
+class FakeGridOutCursor:
+    def __init__(self, stored: list):
+        self._stored = stored
+
+    def limit(self, count: int):
+        self._stored = self._stored[:count]
+        return self
+
+    def __aiter__(self):
+        async def iterate():
+            for stored in self._stored:
+                yield FakeGridOut(stored)
+        return iterate()
+
+
+class FakeGridFSBucket:
+    def __init__(self, bucket_name: str):
+        self.bucket_name = bucket_name
+
+    def _stored(self):
+        return [stored for (bucket, _), stored in list(_files.items()) if bucket == self.bucket_name]
+
+    def open_upload_stream(self, filename, metadata=None, **kwargs):
+        return FakeGridIn(self.bucket_name, filename, metadata)
+
+    async def upload_from_stream(self, filename, source, metadata=None, **kwargs):
+        grid_in = FakeGridIn(self.bucket_name, filename, metadata)
+        await grid_in.write(source)
+        await grid_in.close()
+        return grid_in._id
+
+    async def open_download_stream(self, file_id):
+        stored = _files.get((self.bucket_name, file_id))
+        if stored is None:
+            raise NoFile(f"no file with _id {file_id}")
+        return FakeGridOut(stored)
+
+    async def open_download_stream_by_name(self, filename):
+        matches = [stored for stored in self._stored() if stored["filename"] == filename]
+        if not matches:
+            raise NoFile(f"no file named {filename}")
+        return FakeGridOut(matches[-1])
+
+    async def delete(self, file_id):
+        if _files.pop((self.bucket_name, file_id), None) is None:
+            raise NoFile(f"no file with _id {file_id}")
+
+    def find(self, filter: Optional[dict] = None):
+        def matches(stored):
+            for key, expected in (filter or {}).items():
+                value = stored
+                for part in key.split("."):
+                    value = value.get(part) if isinstance(value, dict) else None
+                if value != expected:
+                    return False
+            return True
+        return FakeGridOutCursor([stored for stored in self._stored() if matches(stored)])
+
+
+def _patch_mongomock_bulk() -> None:
+    # pymongo 4.9+ passes a sort= argument to bulk builders that mongomock does not know.
+    import mongomock.collection as collection
+    builder = collection.BulkOperationBuilder
+    for name in ("add_update", "add_replace"):
+        original = getattr(builder, name)
+        if getattr(original, "_accepts_sort", False):
+            continue
+
+        def patched(self, *args, _original=original, sort=None, **kwargs):
+            return _original(self, *args, **kwargs)
+        patched._accepts_sort = True
+        setattr(builder, name, patched)
+
+
+def install(mongo_uri: Optional[str], llm_latency: float) -> None:
+    """Point app.database at the chosen store and swap the Gemini models for fakes.
+
+    Must run after the app modules are imported: several of them bind
+    get_gridfs_bucket by name.
+    """
+    from app import database
+    from app.config import settings
+    from app.utils.models import model_registry
+
+    if mongo_uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        database.db.client = AsyncIOMotorClient(mongo_uri)
+        settings.MONGODB_DB = f"{settings.MONGODB_DB}_benchmark"
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        _patch_mongomock_bulk()
+        database.db.client = AsyncMongoMockClient()
+
+        async def get_gridfs_bucket(bucket_name: Optional[str] = None):
+            return FakeGridFSBucket(bucket_name or settings.GRIDFS_BUCKET)
+
+        for module in list(sys.modules.values()):
+            name = getattr(module, "__name__", "")
+            if (name == "app.database" or name.startswith("app.")) and hasattr(module, "get_gridfs_bucket"):
+                module.get_gridfs_bucket = get_gridfs_bucket
+
+    settings.WEB_SEARCH_PROVIDER = "stub"
+    model_registry.use(chat_factory=make_chat_model(llm_latency), embeddings_factory=make_embeddings)
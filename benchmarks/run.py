@@ -0,0 +1,244 @@
+"""Offline load test for the research and chat endpoints.
+
+    python -m benchmarks.run --requests 200 --concurrency 16 --file-size 256k
+
+Drives the ASGI app in-process through httpx, with Mongo replaced by
+mongomock (or a local server via --mongo-uri) and the Gemini models by
+deterministic fakes, and prints one JSON document with p50/p95/p99 latency,
+throughput and peak RSS per scenario. Save the output per commit and diff.
+"""
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("MONGO_DB_URI", "mongodb://localhost:27017")
+
+SCENARIOS = ["add_research", "list_research", "download_file", "chat_ask", "chat_ask_document"]
+
+_WORDS = (
+    "sample protein assay buffer control variance enzyme yield catalyst spectrum "
+    "temperature gradient membrane sequence replicate cohort baseline signal noise "
+    "calibration reagent culture density ratio kinetics threshold inhibitor substrate"
+).split()
+
+
+def parse_size(value: str) -> int:
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def make_document(size: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    # The seed in the header keeps every document unique, so uploads are not deduplicated.
+    return (f"Document {seed}\n" + " ".join(words))[:size].encode()
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run_scenario(
+    name: str,
+    requests: int,
+    concurrency: int,
+    call: Callable[[int], Awaitable[int]],
+) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status_code = await call(i)
+            except Exception:
+                status_code = 599
+            latencies.append(time.perf_counter() - started)
+            if status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "duration_s": round(elapsed, 4),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "max": round(max(latencies) * 1000, 3) if latencies else 0.0,
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+async def benchmark(args) -> dict:
+    import httpx
+    from bson import ObjectId
+    from app.main import app
+    from app.config import settings
+    from benchmarks import fakes
+
+    fakes.install(args.mongo_uri, args.llm_latency_ms / 1000)
+    if args.mongo_uri:
+        from app.database import db
+        await db.client.drop_database(settings.MONGODB_DB)
+
+    prefix = settings.API_V1_PREFIX
+    user_id = str(ObjectId())
+    research_ids: List[str] = []
+    file_ids: List[str] = []
+    results = []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+
+        async def add_research(i: int) -> int:
+            body = make_document(args.file_size, seed=i)
+            response = await client.post(
+                f"{prefix}/research/addResearch",
+                params={"user_id": user_id},
+                data={"researchName": f"Benchmark document {i}"},
+                files={"file": (f"document-{i}.txt", body, "text/plain")},
+            )
+            if response.status_code < 400:
+                payload = response.json()
+                research_ids.append(payload["_id"])
+                file_ids.append(payload["file_id"])
+            return response.status_code
+
+        async def list_research(i: int) -> int:
+            response = await client.get(f"{prefix}/research/", params={"user_id": user_id, "limit": 20})
+            return response.status_code
+
+        async def download_file(i: int) -> int:
+            response = await client.get(f"{prefix}/research/file/{file_ids[i % len(file_ids)]}")
+            return response.status_code
+
+        async def chat_ask(i: int) -> int:
+            response = await client.post(
+                f"{prefix}/chat/ask",
+                params={"user_id": user_id, "question": f"What does experiment {i} show?"},
+            )
+            return response.status_code
+
+        async def chat_ask_document(i: int) -> int:
+            response = await client.post(
+                f"{prefix}/chat/ask",
+                params={
+                    "user_id": user_id,
+                    "question": f"Summarize the findings about sample {i}",
+                    "document_id": research_ids[i % len(research_ids)],
+                },
+            )
+            return response.status_code
+
+        calls = {
+            "add_research": add_research,
+            "list_research": list_research,
+            "download_file": download_file,
+            "chat_ask": chat_ask,
+            "chat_ask_document": chat_ask_document,
+        }
+        for name in args.scenarios:
+            if name in ("download_file", "chat_ask_document") and not research_ids:
+                # These need stored documents; seed them without timing.
+                await run_scenario("seed", args.documents, args.concurrency, add_research)
+            results.append(await run_scenario(name, args.requests, args.concurrency, calls[name]))
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "store": "mongodb" if args.mongo_uri else "mongomock",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "file_size": args.file_size,
+            "llm_latency_ms": args.llm_latency_ms,
+        },
+        "scenarios": results,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--file-size", type=parse_size, default=parse_size("64k"),
+                        help="size of uploaded documents, e.g. 64k or 2m")
+    parser.add_argument("--documents", type=int, default=20,
+                        help="documents to seed when a scenario needs them and add_research did not run")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="simulated latency of every fake LLM call")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--mongo-uri", default=None,
+                        help="use a local MongoDB instead of mongomock (database <name>_benchmark is dropped first)")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = json.dumps(asyncio.run(benchmark(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()